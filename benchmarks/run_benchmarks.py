@@ -0,0 +1,294 @@
+"""
+Benchmarks for the classifier, rhyme checker and poem structure checker hot paths.
+
+Runs every benchmark over a synthetic corpus generated from the bundled rhyme dictionary with a fixed seed,
+and reports throughput, latency percentiles and peak memory per component, plus import/startup time. Each
+timing is measured over --repeat passes in each of --processes fresh processes, and the best value is reported,
+as with timeit: slower passes are slowed down by other activity on the machine or an unlucky process rather
+than by the code, so the best value varies least between runs.
+
+    python benchmarks/run_benchmarks.py                      # print the results
+    python benchmarks/run_benchmarks.py --save baseline.json # also save them
+    python benchmarks/run_benchmarks.py --compare baseline.json --tolerance 0.2
+
+With --compare, the run fails (exit code 1) if any metric is more than --tolerance worse than the baseline.
+Tail latencies (p95 and p99) vary more between runs, so they are compared with --tail-tolerance instead.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pingshui_rhyme import PingZeClassifier, RhymeChecker, PoemStructureChecker
+from pingshui_rhyme.rhyme_data import RhymeData, DEFAULT_JSON_PATH, load_rhyme_data, clear_rhyme_data
+
+
+def generate_corpus(seed, size):
+    """
+    Generates sentences, character pairs and poems from the bundled JSON.
+
+    Half of the poems follow one of the strict ping-ze patterns, the rest use random characters. Only CJK
+    characters are used, since the data also lists a few letters, digits and punctuation marks.
+    """
+    rng = random.Random(seed)
+    data = RhymeData.from_json(DEFAULT_JSON_PATH)
+    han = re.compile('[\u3400-\u9fff\uf900-\ufaff\U00020000-\U0002fa1f]')
+    ping = [char for char in dict.fromkeys(data.ping_characters) if char not in data.ze_characters and han.match(char)]
+    ze = [char for char in dict.fromkeys(data.ze_characters) if char not in data.ping_characters and han.match(char)]
+    chars = ping + ze
+
+    sentences = [''.join(rng.choice(chars) for _ in range(rng.choice([5, 7]))) for _ in range(size)]
+    pairs = [(rng.choice(chars), rng.choice(chars)) for _ in range(size)]
+
+    patterns = PoemStructureChecker().patterns
+    poems = []
+    for i in range(size // 10):
+        characters_per_line = rng.choice([5, 7])
+        line_count = rng.choice([4, 8])
+        if i % 2 == 0:
+            expected_patterns = rng.choice(list(patterns[characters_per_line].values()))
+            lines = [''.join(rng.choice(ping if tone == '平' else ze) for tone in expected_patterns[j]) for j in range(line_count)]
+        else:
+            lines = [''.join(rng.choice(chars) for _ in range(characters_per_line)) for _ in range(line_count)]
+        poems.append('，\n'.join(lines) + '。')
+
+    return sentences, pairs, poems
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _timed_pass(func, items):
+    """Calls func on each item, returning the elapsed time of the pass and the sorted latencies of the calls."""
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        call_start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies
+
+
+def measure(benchmarks, repeat=5):
+    """
+    Times each benchmark, a (name, func, items, unit, units_per_item) tuple, and returns the metrics of all of them.
+
+    func is called on each item. units_per_item gives the throughput unit count of an item, e.g. its number of
+    characters, or None to count items. Each benchmark is timed in repeat passes, taken in turn with those of the
+    other benchmarks so that a slow spell of the machine doesn't fall on all passes of one benchmark, and each
+    metric is its best value over the passes. Peak memory is measured in a separate pass, since tracing allocations
+    slows every call down.
+    """
+    # Warm up lazily built indexes and lookups before measuring
+    for _, func, items, _, _ in benchmarks:
+        for item in items:
+            func(item)
+
+    passes = {name: [] for name, _, _, _, _ in benchmarks}
+    for _ in range(repeat):
+        for name, func, items, _, _ in benchmarks:
+            passes[name].append(_timed_pass(func, items))
+
+    results = {}
+    for name, func, items, unit, units_per_item in benchmarks:
+        total_units = sum(units_per_item(item) for item in items) if units_per_item else len(items)
+        best = {
+            fraction: min(percentile(latencies, fraction) for _, latencies in passes[name])
+            for fraction in (0.50, 0.95, 0.99)
+        }
+
+        tracemalloc.start()
+        for item in items:
+            func(item)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.update({
+            f'{name}.throughput': (total_units / min(elapsed for elapsed, _ in passes[name]), f'{unit}/s', True),
+            f'{name}.p50': (best[0.50] * 1e6, 'us', False),
+            f'{name}.p95': (best[0.95] * 1e6, 'us', False),
+            f'{name}.p99': (best[0.99] * 1e6, 'us', False),
+            f'{name}.peak_memory': (peak / 1024, 'KiB', False),
+        })
+    return results
+
+
+def measure_startup(runs):
+    """Measures the wall time of a fresh interpreter importing the package and answering a first query."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        "from pingshui_rhyme import PingZeClassifier; PingZeClassifier().classify('東'); "
+        "print(time.perf_counter() - start)"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = sorted(
+        float(subprocess.check_output([sys.executable, '-c', code], cwd=root))
+        for _ in range(runs)
+    )
+    return {'startup.first_query': (percentile(times, 0.5) * 1e3, 'ms', False)}
+
+
+def _load_all(path):
+    clear_rhyme_data()
+    data = load_rhyme_data(path)
+    data.tone_index, data.rhyme_dict, data.rhyme_masks
+
+
+def measure_loading(repeat=5):
+    """Measures the time and peak memory of loading the rhyme data and building every index, and of constructing checkers."""
+    results = {}
+    # Time several loads per pass where one is too short to time reliably
+    for name, path, number in [('load.compiled', None, 20), ('load.json', DEFAULT_JSON_PATH, 1)]:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                _load_all(path)
+            times.append((time.perf_counter() - start) / number)
+        results[f'{name}.time'] = (min(times) * 1e3, 'ms', False)
+
+        tracemalloc.start()
+        _load_all(path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f'{name}.peak_memory'] = (peak / 1024, 'KiB', False)
+
+    # Construction reuses the loaded data, so it should cost next to nothing
+    load_rhyme_data().rhyme_masks
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        checkers = [PoemStructureChecker() for _ in range(10000)]
+        times.append(time.perf_counter() - start)
+        del checkers
+    results['construct.checker.time'] = (min(times) * 1e2, 'us', False)
+
+    tracemalloc.start()
+    checkers = [PoemStructureChecker() for _ in range(1000)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del checkers
+    results['construct.checker.memory'] = (size / 1000, 'B', False)
+    return results
+
+
+def run_in_process(args):
+    """Runs the loading and hot path benchmarks in this process."""
+    sentences, pairs, poems = generate_corpus(args.seed, args.size)
+    classifier = PingZeClassifier()
+    rhyme_checker = RhymeChecker()
+    checker = PoemStructureChecker()
+
+    results = {}
+    results.update(measure_loading(args.repeat))
+    results.update(measure([
+        ('classify', classifier.classify, sentences, 'chars', len),
+        ('classify_codes', classifier.classify_codes, sentences, 'chars', len),
+        ('do_rhyme', lambda pair: rhyme_checker.do_rhyme(*pair), pairs, 'pairs', None),
+        ('check_poem_rhyming', checker.check_poem_rhyming, poems, 'poems', None),
+        ('check_poem_pingze_meter', checker.check_poem_pingze_meter, poems, 'poems', None),
+    ], args.repeat))
+    return results
+
+
+def run(args):
+    """
+    Runs every benchmark, the in-process ones in args.processes fresh worker processes, keeping each metric's best value.
+
+    How fast a process runs the same code can differ between processes by more than any tolerance, e.g. with
+    the memory layout it happens to get, so a single process can't tell a regression from a slow process.
+    """
+    results = measure_startup(args.startup_runs)
+    if args.processes <= 1:
+        results.update(run_in_process(args))
+        return results
+
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker',
+        '--seed', str(args.seed), '--size', str(args.size), '--repeat', str(args.repeat),
+    ]
+    for _ in range(args.processes):
+        for name, (value, unit, higher_is_better) in json.loads(subprocess.check_output(command)).items():
+            if name in results:
+                best = max if higher_is_better else min
+                value = best(value, results[name][0])
+            results[name] = (value, unit, higher_is_better)
+    return results
+
+
+def compare(results, baseline, tolerance, tail_tolerance=None):
+    """
+    Returns a description of every metric that is more than tolerance worse than in the baseline.
+
+    p95 and p99 latencies are allowed tail_tolerance instead, which defaults to tolerance.
+    """
+    if tail_tolerance is None:
+        tail_tolerance = tolerance
+
+    regressions = []
+    for name, (value, unit, higher_is_better) in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name][0]
+        if base == 0:
+            continue
+        allowed = tail_tolerance if name.endswith(('.p95', '.p99')) else tolerance
+        change = (value - base) / base
+        if (higher_is_better and change < -allowed) or (not higher_is_better and change > allowed):
+            regressions.append(f"{name}: {value:.2f} {unit} vs baseline {base:.2f} {unit} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic corpus (default: 0)')
+    parser.add_argument('--size', type=int, default=20000, help='number of sentences and character pairs; a tenth as many poems (default: 20000)')
+    parser.add_argument('--startup-runs', type=int, default=5, help='fresh interpreters to time for startup (default: 5)')
+    parser.add_argument('--repeat', type=int, default=10, help='timed passes per benchmark and process (default: 10)')
+    parser.add_argument('--processes', type=int, default=5, help='worker processes to run the benchmarks in, of which the best result is reported (default: 5)')
+    parser.add_argument('--save', metavar='FILE', help='save the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression per metric (default: 0.2)')
+    parser.add_argument('--tail-tolerance', type=float, default=0.5, help='allowed relative regression of p95 and p99 latencies (default: 0.5)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        # Report the results of this process to the parent
+        print(json.dumps(run_in_process(args)))
+        return 0
+
+    results = run(args)
+    for name, (value, unit, _) in sorted(results.items()):
+        print(f"{name:40} {value:14.2f} {unit}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.tail_tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%} ({args.tail_tolerance:.0%} for p95/p99):")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo metric regressed by more than {args.tolerance:.0%} ({args.tail_tolerance:.0%} for p95/p99).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,7 @@
 from .classifier import PingZeClassifier
 from .rhymechecker import RhymeChecker
 from .poem_structure_checker import PoemStructureChecker
+from .session import PoemSession
+from .rhyme_data import register_rhyme_book, rhyme_books
 
-__all__ = ['PingZeClassifier', 'RhymeChecker', 'PoemStructureChecker']
\ No newline at end of file
+__all__ = ['PingZeClassifier', 'RhymeChecker', 'PoemStructureChecker', 'PoemSession', 'register_rhyme_book', 'rhyme_books']
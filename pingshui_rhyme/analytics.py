@@ -0,0 +1,235 @@
+"""
+Tone statistics over whole corpora of poems.
+
+With NumPy installed, a batch of poems is classified in one vectorized step, by mapping its codepoints through a
+lookup table of tone codes, and the statistics are counted on the resulting uint8 array. Without NumPy the same
+statistics are computed in pure Python, one poem at a time.
+"""
+from .rhyme_data import UNKNOWN, PING, ZE, BOTH, _FIRST_MATCH_CODES
+from .poem_structure_checker import PoemStructureChecker
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BACKENDS = ('numpy', 'python')
+
+
+def _alternation_positions(characters_per_line):
+    # The same 2nd, 4th and 6th characters as MeterEngine.alternation_mismatch
+    return (1, 3, 5) if characters_per_line == 7 else (1, 3)
+
+
+class CorpusAnalyzer:
+    """
+    Computes ping-ze statistics of a corpus of poems, using NumPy if it is installed.
+
+    backend is 'numpy' or 'python'; the default is 'numpy' when NumPy can be imported. Both backends give the
+    same results. Poems are classified batch_size at a time for each poem shape, which bounds memory use.
+    """
+
+    def __init__(self, checker=None, backend=None, batch_size=10000):
+        if backend is None:
+            backend = 'numpy' if numpy is not None else 'python'
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+        if backend == 'numpy' and numpy is None:
+            raise ImportError("The numpy backend requires NumPy to be installed.")
+
+        self.checker = checker if checker is not None else PoemStructureChecker()
+        self.backend = backend
+        self.batch_size = batch_size
+        self._luts = {}
+
+        # The tone each scheme requires at each position of each line, from the checker's compiled patterns,
+        # or UNKNOWN where any tone is allowed
+        self.requirements = {
+            characters_per_line: [(scheme.name, self._required_tones(scheme, characters_per_line)) for scheme in schemes]
+            for characters_per_line, schemes in self.checker.meter.schemes.items()
+        }
+
+    @staticmethod
+    def _required_tones(scheme, characters_per_line):
+        required = []
+        for i in range(scheme.line_count):
+            line = bytearray(characters_per_line)
+            for j in range(characters_per_line):
+                bit = 1 << (i * characters_per_line + j)
+                if scheme.ping_mask & bit:
+                    line[j] = PING
+                elif scheme.ze_mask & bit:
+                    line[j] = ZE
+            required.append(bytes(line))
+        return required
+
+    def _lut(self, polyphonic):
+        """Returns the lookup table of tone codes indexed by codepoint, whose last entry is for every higher codepoint."""
+        lut = self._luts.get(polyphonic)
+        if lut is None:
+            codepoints, masks = zip(*self.checker.classifier.data.tone_mask_items())
+            codepoints = numpy.array(codepoints, numpy.uint32)
+            lut = numpy.zeros(int(codepoints.max()) + 2, numpy.uint8)
+            lut[codepoints] = numpy.array(masks, numpy.uint8)
+            if not polyphonic:
+                lut = numpy.frombuffer(_FIRST_MATCH_CODES, numpy.uint8)[lut]
+            lut = self._luts[polyphonic] = lut
+        return lut
+
+    def tone_codes(self, texts, polyphonic=False):
+        """
+        Classifies the characters of a sequence of texts as one run of tone codes, like PingZeClassifier.classify_codes.
+
+        Returns a uint8 NumPy array with the numpy backend, and bytes with the python backend.
+        """
+        text = ''.join(texts)
+        if self.backend == 'python':
+            return self.checker.classifier.classify_codes(text, polyphonic)
+
+        lut = self._lut(polyphonic)
+        codepoints = numpy.frombuffer(text.encode('utf-32-le'), numpy.uint32)
+        return lut[numpy.minimum(codepoints, len(lut) - 1)]
+
+    def analyze(self, poems, polyphonic=None):
+        """
+        Computes tone statistics of an iterable of poems, split into lines like clean_poem.
+
+        Poems whose lines all have 5 or 7 characters are counted under that line length; other poems are skipped.
+        polyphonic defaults to the checker's setting. Returns a dict of:
+
+        - 'poems' and 'skipped': the number of poems read and skipped
+        - 'lengths': for each line length, a dict of:
+          - 'poems' and 'lines': the number of poems and lines counted
+          - 'histogram': for each character position, the counts of [unknown, ping, ze, both] tones
+          - 'alternation_pairs': the number of line pairs compared by the 2nd, 4th, 6th character alternation check
+          - 'alternation_violations': for each character position, the number of pairs whose tones don't alternate there
+          - 'matches': for each scheme, the number of poems following it, as in check_poem_pingze_meter;
+            'unmatched' counts the poems following none
+          - 'deviations': for each scheme, the number of poems whose tone differs from the scheme at each
+            position of each line, over the poems that have no more lines than the scheme
+        """
+        if polyphonic is None:
+            polyphonic = self.checker.polyphonic
+
+        stats = {'poems': 0, 'skipped': 0, 'lengths': {}}
+        batches = {}
+        for poem in poems:
+            stats['poems'] += 1
+            lines = self.checker.clean_poem(poem)
+            characters_per_line = len(lines[0]) if lines else 0
+            if characters_per_line not in self.requirements or any(len(line) != characters_per_line for line in lines):
+                stats['skipped'] += 1
+                continue
+
+            shape = (len(lines), characters_per_line)
+            batch = batches.setdefault(shape, [])
+            batch.append(''.join(lines))
+            if len(batch) >= self.batch_size:
+                self._add_batch(stats, shape, batch, polyphonic)
+                batches[shape] = []
+
+        for shape, batch in batches.items():
+            if batch:
+                self._add_batch(stats, shape, batch, polyphonic)
+        return stats
+
+    def _new_entry(self, characters_per_line):
+        requirements = self.requirements[characters_per_line]
+        return {
+            'poems': 0,
+            'lines': 0,
+            'histogram': [[0] * 4 for _ in range(characters_per_line)],
+            'alternation_pairs': 0,
+            'alternation_violations': [0] * characters_per_line,
+            'matches': dict.fromkeys([name for name, _ in requirements] + ['unmatched'], 0),
+            'deviations': {
+                name: [[0] * characters_per_line for _ in required] for name, required in requirements
+            },
+        }
+
+    def _add_batch(self, stats, shape, texts, polyphonic):
+        line_count, characters_per_line = shape
+        entry = stats['lengths'].get(characters_per_line)
+        if entry is None:
+            entry = stats['lengths'][characters_per_line] = self._new_entry(characters_per_line)
+
+        entry['poems'] += len(texts)
+        entry['lines'] += len(texts) * line_count
+        entry['alternation_pairs'] += len(texts) * (line_count // 2)
+
+        if self.backend == 'numpy':
+            self._count_numpy(entry, shape, texts, polyphonic)
+        else:
+            self._count_python(entry, shape, texts, polyphonic)
+
+    def _count_numpy(self, entry, shape, texts, polyphonic):
+        line_count, characters_per_line = shape
+        codes = self.tone_codes(texts, polyphonic).reshape(len(texts), line_count, characters_per_line)
+
+        # Count each (position, tone) pair at once by numbering them position * 4 + tone
+        numbered = numpy.arange(characters_per_line) * 4 + codes
+        histogram = numpy.bincount(numbered.ravel(), minlength=4 * characters_per_line).reshape(characters_per_line, 4)
+        _add_rows(entry['histogram'], histogram.tolist())
+
+        if line_count >= 2:
+            first = codes[:, 0:line_count - 1:2]
+            second = codes[:, 1:line_count:2]
+            violations = ((first == second) & (first != BOTH)).sum(axis=(0, 1))
+            for pos in _alternation_positions(characters_per_line):
+                entry['alternation_violations'][pos] += int(violations[pos])
+
+        # Poems not yet matched by an earlier scheme, since each poem counts for the first scheme it follows
+        unmatched = numpy.ones(len(texts), bool)
+        for name, required in self.requirements[characters_per_line]:
+            if line_count > len(required):
+                continue
+            required = numpy.frombuffer(b''.join(required[:line_count]), numpy.uint8).reshape(line_count, characters_per_line)
+            deviates = ((codes & required) == 0) & (required != UNKNOWN)
+            _add_rows(entry['deviations'][name], deviates.sum(axis=0).tolist())
+
+            follows = unmatched & ~deviates.any(axis=(1, 2))
+            entry['matches'][name] += int(follows.sum())
+            unmatched &= ~follows
+        entry['matches']['unmatched'] += int(unmatched.sum())
+
+    def _count_python(self, entry, shape, texts, polyphonic):
+        line_count, characters_per_line = shape
+        histogram = entry['histogram']
+        violations = entry['alternation_violations']
+        positions = _alternation_positions(characters_per_line)
+        requirements = [
+            (name, required) for name, required in self.requirements[characters_per_line] if line_count <= len(required)
+        ]
+
+        for text in texts:
+            codes = self.tone_codes([text], polyphonic)
+            line_codes = [codes[i:i + characters_per_line] for i in range(0, len(codes), characters_per_line)]
+
+            for pos, code in enumerate(codes):
+                histogram[pos % characters_per_line][code] += 1
+
+            for i in range(0, line_count - 1, 2):
+                for pos in positions:
+                    if line_codes[i][pos] == line_codes[i + 1][pos] != BOTH:
+                        violations[pos] += 1
+
+            matched = False
+            for name, required in requirements:
+                deviations = entry['deviations'][name]
+                follows = True
+                for i, line in enumerate(line_codes):
+                    for pos, code in enumerate(line):
+                        if required[i][pos] != UNKNOWN and not code & required[i][pos]:
+                            deviations[i][pos] += 1
+                            follows = False
+                if follows and not matched:
+                    entry['matches'][name] += 1
+                    matched = True
+            if not matched:
+                entry['matches']['unmatched'] += 1
+
+
+def _add_rows(totals, counts):
+    for total_row, count_row in zip(totals, counts):
+        for i, count in enumerate(count_row):
+            total_row[i] += count
@@ -0,0 +1,168 @@
+"""
+Asyncio front end for the classifier and poem structure checker.
+
+The checks are CPU-bound, so AsyncChecker runs them in an executor instead of on the event loop. Poems submitted
+concurrently with acheck_poem are gathered into batches so that a burst of small requests costs a few executor
+calls rather than one each, and bulk work from acheck_corpus and aclassify_batch is sent in chunks with only a
+few chunks in the executor at once, so small requests are never queued behind a whole collection.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .poem_structure_checker import PoemStructureChecker, _build_worker_checker
+
+# Python 3.6 has no get_running_loop; its get_event_loop returns the running loop when called from a coroutine
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+def _check_batch(checker, poems):
+    return [checker.check_poem(poem) for poem in poems]
+
+
+def _classify_batch(checker, sentences, polyphonic):
+    return list(checker.classifier.classify_batch(sentences, polyphonic))
+
+
+# The checkers used by tasks run in a process pool, one per checker configuration
+_worker_checkers = {}
+
+
+def _run_in_worker(checker_args, task, *args):
+    checker = _worker_checkers.get(checker_args)
+    if checker is None:
+        checker = _worker_checkers[checker_args] = _build_worker_checker(*checker_args)
+    return task(checker, *args)
+
+
+async def _chunks(items, chunksize):
+    """Yields lists of up to chunksize items from an iterable or an async iterable."""
+    chunk = []
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+    else:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class AsyncChecker:
+    """
+    Runs the checks of a PoemStructureChecker in an executor without blocking the event loop.
+
+    executor is any concurrent.futures executor; the default is the event loop's default thread pool. With a
+    ProcessPoolExecutor, each worker process builds its own checker with the same settings as checker.
+    Up to max_batch concurrent acheck_poem calls are checked together in one executor call, and at most
+    max_pending acheck_poem calls are admitted at once; further calls wait until earlier ones complete.
+    Bulk methods keep at most max_chunks chunks in the executor at once.
+    """
+
+    def __init__(self, checker=None, executor=None, max_batch=64, max_pending=1024, max_chunks=2):
+        if max_batch < 1 or max_pending < 1 or max_chunks < 1:
+            raise ValueError("max_batch, max_pending and max_chunks must be at least 1.")
+
+        self.checker = checker if checker is not None else PoemStructureChecker()
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_chunks = max_chunks
+
+        # The semaphore and the batch belong to the event loop that last used the checker, and are replaced when
+        # another loop uses it, e.g. in successive asyncio.run calls
+        self._loop = None
+        self._semaphore = None
+        self._batch = []
+        self._flush_scheduled = False
+
+    def _use_loop(self, loop):
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+            self._batch = []
+            self._flush_scheduled = False
+
+    def _submit(self, task, *args):
+        """Runs task(checker, *args) in the executor, returning an asyncio future of its result."""
+        loop = _get_running_loop()
+        if isinstance(self.executor, ProcessPoolExecutor):
+            return loop.run_in_executor(self.executor, _run_in_worker, self.checker._worker_args(), task, *args)
+        return loop.run_in_executor(self.executor, task, self.checker, *args)
+
+    async def acheck_poem(self, poem):
+        """Checks a poem like PoemStructureChecker.check_poem, returning its (rhyming, meter) pair."""
+        loop = _get_running_loop()
+        self._use_loop(loop)
+
+        async with self._semaphore:
+            future = loop.create_future()
+            self._batch.append((poem, future))
+            if len(self._batch) >= self.max_batch:
+                self._flush()
+            elif not self._flush_scheduled:
+                # Let every request submitted in this event loop iteration join the batch first
+                self._flush_scheduled = True
+                loop.call_soon(self._flush)
+            return await future
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        result = self._submit(_check_batch, [poem for poem, _ in batch])
+        result.add_done_callback(lambda result: self._resolve(batch, result))
+
+    @staticmethod
+    def _resolve(batch, result):
+        if result.cancelled():
+            for _, future in batch:
+                future.cancel()
+            return
+        error = result.exception()
+        if error is not None:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), verdict in zip(batch, result.result()):
+            if not future.done():
+                future.set_result(verdict)
+
+    async def _map_chunks(self, task, items, chunksize, *args):
+        """Yields task's results for each chunk of items in order, with at most max_chunks chunks in flight."""
+        pending = deque()
+        try:
+            async for chunk in _chunks(items, chunksize):
+                pending.append(self._submit(task, chunk, *args))
+                if len(pending) >= self.max_chunks:
+                    for result in await pending.popleft():
+                        yield result
+            while pending:
+                for result in await pending.popleft():
+                    yield result
+        finally:
+            # Stop any remaining chunks if the caller stops iterating early
+            for result in pending:
+                result.cancel()
+
+    async def acheck_corpus(self, poems, chunksize=64):
+        """
+        Checks every poem of an iterable or async iterable, yielding check_poem results in input order.
+
+        Poems are read chunksize at a time, and only as results are consumed.
+        """
+        async for result in self._map_chunks(_check_batch, poems, chunksize):
+            yield result
+
+    async def aclassify_batch(self, sentences, polyphonic=False, chunksize=256):
+        """Classifies each sentence of an iterable or async iterable, yielding one classification list per sentence."""
+        async for result in self._map_chunks(_classify_batch, sentences, chunksize, polyphonic):
+            yield result
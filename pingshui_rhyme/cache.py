@@ -0,0 +1,77 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+# Every live cache, for the totals reported by instrumentation.snapshot
+_caches = weakref.WeakSet()
+
+
+class VerdictCache:
+    """
+    A bounded, thread-safe cache of check results.
+
+    When the cache is full, adding an entry evicts the least recently used one ('lru'), or the oldest one
+    regardless of use ('fifo'). The hits, misses and evictions counters can be read at any time.
+    """
+
+    def __init__(self, maxsize=1024, policy='lru'):
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1.")
+        if policy not in ('lru', 'fifo'):
+            raise ValueError("Cache eviction policy must be 'lru' or 'fifo'.")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for key, calling compute() and caching its result if there is none.
+
+        compute runs outside the lock, so threads missing on the same key at once may each compute it.
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if self.policy == 'lru':
+                    self._entries.move_to_end(key)
+                return value
+
+        value = compute()
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def stats(self):
+        """Returns the counters and the current number of entries as a dict."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def clear(self):
+        """Removes every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
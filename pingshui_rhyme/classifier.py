@@ -1,45 +1,45 @@
-import json
-import pkg_resources
+from .rhyme_data import load_rhyme_data, get_rhyme_book, UNKNOWN, PING, ZE, BOTH, TONE_NAMES
 
 class PingZeClassifier:
     def __init__(self, json_file_path=None):
-        if json_file_path is None:
-            # Default to the JSON in the package data folder
-            json_file_path = pkg_resources.resource_filename(
-                __name__, 'data/organized_ping_ze_rhyme_dict.json'
-            )
-
-        # Load the ping-ze rhyme dictionary from the provided JSON file
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            self.ping_ze_dict = json.load(file)
-                    
-        # Collapse the ping and ze characters into strings
-        self.ping_characters, self.ze_characters = self._collapse_ping_ze()
-
-    def _collapse_ping_ze(self):
-        """Helper function to collapse all characters in the ping and ze sections into strings."""
-        ping_dict = self.ping_ze_dict.get('ping', {})
-        ze_dict = self.ping_ze_dict.get('ze', {})
-
-        # Extract all characters from ping
-        ping_characters = "".join([char for rhyme_group in ping_dict.values() for rhymes in rhyme_group.values() for char in rhymes])
-
-        # Extract all characters from ze
-        ze_characters = "".join([char for rhyme_group in ze_dict.values() for rhymes in rhyme_group.values() for char in rhymes])
-
-        return ping_characters, ze_characters
-
-    def classify(self, sentence):
-        """Classifies each character in a sentence as 'ping', 'ze', or 'unknown'."""
-        classification = []
-
-        # Classify each character in the sentence
-        for char in sentence:
-            if char in self.ping_characters:
-                classification.append('ping')
-            elif char in self.ze_characters:
-                classification.append('ze')
-            else:
-                classification.append('unknown')
-        
-        return classification
+        # Share the loaded rhyme dictionary with every other classifier and checker using the same file
+        self.data = load_rhyme_data(json_file_path)
+        self.ping_ze_dict = self.data.view('ping_ze_dict')
+
+        # All characters in the ping and ze sections, collapsed into strings
+        self.ping_characters = self.data.ping_characters
+        self.ze_characters = self.data.ze_characters
+
+        # The tone of every character, indexed by codepoint
+        self.tone_index = self.data.view('tone_index')
+
+    @property
+    def polyphones(self):
+        """The set of characters listed under both ping and ze, such as 鄉, 看 and 思."""
+        return self.data.polyphones
+
+    def classify(self, sentence, polyphonic=False, book=None):
+        """
+        Classifies each character in a sentence as 'ping', 'ze', or 'unknown'.
+
+        Characters listed under both tones are classified as 'ping', unless polyphonic is set, in which case they are classified as 'both'.
+        book classifies with another rhyme book for this call only, given as a registered name, a data file path or a RhymeData.
+        """
+        return [TONE_NAMES[code] for code in self.classify_codes(sentence, polyphonic, book)]
+
+    def classify_codes(self, sentence, polyphonic=False, book=None):
+        """
+        Classifies each character in a sentence and returns the tone codes as bytes.
+
+        Each byte is one of UNKNOWN (0), PING (1) or ZE (2), in the same order as the characters of the sentence.
+        If polyphonic is set, characters listed under both tones are coded as BOTH (3) instead of PING.
+        """
+        data = self.data if book is None else get_rhyme_book(book)
+        if polyphonic:
+            return sentence.translate(data.tone_masks).encode('latin-1')
+        return sentence.translate(data.tone_index).encode('latin-1')
+
+    def classify_batch(self, sentences, polyphonic=False, book=None):
+        """Classifies each sentence of an iterable, yielding one classification list per sentence."""
+        for sentence in sentences:
+            yield self.classify(sentence, polyphonic, book)
@@ -0,0 +1,200 @@
+"""
+Command-line interface for classifying text and checking poems.
+
+Input is read line by line from files or stdin and results are written one line at a time as JSONL or TSV,
+so arbitrarily large inputs are processed with bounded memory.
+"""
+import argparse
+import json
+import sys
+from functools import partial
+from itertools import tee
+
+from .classifier import PingZeClassifier
+from .rhymechecker import RhymeChecker
+from .poem_structure_checker import PoemStructureChecker
+from .parallel import bounded_imap
+from .segmenter import segment_poems
+
+
+def _read_lines(paths, stdin=None):
+    """Yields the lines of each file in turn without their line endings, reading stdin for '-'."""
+    for path in paths or ['-']:
+        if path == '-':
+            if stdin is None:
+                # Read UTF-8 regardless of the locale
+                stdin = open(sys.stdin.fileno(), 'r', encoding='utf-8', closefd=False)
+            for line in stdin:
+                yield line.rstrip('\r\n')
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield line.rstrip('\r\n')
+
+
+def _read_poems(lines, per_line, segment=False):
+    """
+    Yields poems from lines, either one per non-blank line or as blocks separated by blank lines.
+
+    With segment, poems are instead found by segment_poems, skipping any other text.
+    """
+    if segment:
+        for poem in segment_poems(line + '\n' for line in lines):
+            yield '\n'.join(poem)
+        return
+
+    if per_line:
+        for line in lines:
+            if line.strip():
+                yield line.strip()
+        return
+
+    block = []
+    for line in lines:
+        if line.strip():
+            block.append(line.strip())
+        elif block:
+            yield '\n'.join(block)
+            block = []
+    if block:
+        yield '\n'.join(block)
+
+
+# The object used by each worker process when running with --jobs
+_worker = None
+
+
+def _init_worker(factory, json_file_path):
+    global _worker
+    _worker = factory(json_file_path)
+
+
+class _TaskRunner:
+    """Picklable callable that runs a task with the worker process's object."""
+
+    def __init__(self, task):
+        self.task = task
+
+    def __call__(self, item):
+        return self.task(_worker, item)
+
+
+def _map(task, factory, items, args):
+    """Yields task(obj, item) for each item in order, where obj is built by factory, using args.jobs processes."""
+    if args.jobs == 1:
+        obj = factory(args.data)
+        for item in items:
+            yield task(obj, item)
+        return
+
+    from multiprocessing import Pool
+    with Pool(args.jobs, initializer=_init_worker, initargs=(factory, args.data)) as pool:
+        for result in bounded_imap(pool, _TaskRunner(task), items, args.chunksize, args.jobs):
+            yield result
+
+
+def _classify(classifier, line, polyphonic=False):
+    return line, classifier.classify(line, polyphonic)
+
+
+def _rhyme(rhyme_checker, line):
+    chars = ''.join(line.split())
+    rhyme_masks = rhyme_checker.rhyme_masks
+
+    # The characters rhyme together if they all share at least one rhyme category
+    common = -1 if chars else 0
+    for char in chars:
+        common &= rhyme_masks.get(char, 0)
+
+    groups = [[category for _, _, category in rhyme_checker.get_rhyme_group(char) or ()] for char in chars]
+    return chars, bool(common), groups
+
+
+def _write_classify(out, fmt, result):
+    line, tones = result
+    if fmt == 'tsv':
+        out.write(f"{line}\t{' '.join(tones)}\n")
+    else:
+        out.write(json.dumps({'text': line, 'tones': tones}, ensure_ascii=False) + '\n')
+
+
+def _write_rhyme(out, fmt, result):
+    chars, rhymes, groups = result
+    if fmt == 'tsv':
+        out.write(f"{chars}\t{str(rhymes).lower()}\t{' '.join(','.join(g) for g in groups)}\n")
+    else:
+        out.write(json.dumps({'text': chars, 'rhymes': rhymes, 'groups': groups}, ensure_ascii=False) + '\n')
+
+
+def _write_check(out, fmt, result):
+    poem, ((rhyming, rhyming_message), (meter, meter_message)) = result
+    if fmt == 'tsv':
+        poem = poem.replace('\n', '/')
+        out.write(f"{poem}\t{str(rhyming).lower()}\t{rhyming_message}\t{str(meter).lower()}\t{meter_message}\n")
+    else:
+        record = {
+            'poem': poem,
+            'rhyming': rhyming,
+            'rhyming_message': rhyming_message,
+            'meter': meter,
+            'meter_message': meter_message,
+        }
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog='pingshui-rhyme',
+        description='Classify ping-ze tones and check classical Chinese poems using the Pingshui rhyme scheme.',
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('files', nargs='*', help="input files, read in order (default: stdin, or '-')")
+    common.add_argument('--format', choices=['jsonl', 'tsv'], default='jsonl', help='output format (default: jsonl)')
+    common.add_argument('--jobs', '-j', type=int, default=1, help='number of worker processes (default: 1)')
+    common.add_argument('--chunksize', type=int, default=256, help='lines or poems sent to a worker at a time (default: 256)')
+    common.add_argument('--data', help='rhyme dictionary to use, as JSON or a compiled .bin table')
+
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    classify = subparsers.add_parser('classify', parents=[common], help='classify the ping-ze tone of each character of each line')
+    classify.add_argument('--polyphonic', action='store_true', help="classify characters listed under both ping and ze as 'both'")
+    subparsers.add_parser('rhyme', parents=[common], help='look up the rhyme groups of the characters on each line and whether they rhyme')
+    check = subparsers.add_parser('check', parents=[common], help='check the rhyming and ping-ze meter of each poem')
+    check.add_argument('--per-line', action='store_true', help='read one poem per line instead of blocks separated by blank lines')
+    check.add_argument('--segment', action='store_true', help='find the poems in the text by their punctuation, line breaks and line lengths, skipping other text')
+    check.add_argument('--polyphonic', action='store_true', help='let characters listed under both ping and ze take either tone in the meter check')
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None):
+    args = _build_parser().parse_args(argv)
+    if args.jobs < 1:
+        args.jobs = None  # Use every CPU
+
+    # Write UTF-8 regardless of the locale
+    if stdout is None:
+        stdout = open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+
+    lines = _read_lines(args.files, stdin)
+
+    if args.command == 'classify':
+        results = _map(partial(_classify, polyphonic=args.polyphonic), PingZeClassifier, lines, args)
+        write = _write_classify
+    elif args.command == 'rhyme':
+        results = _map(_rhyme, RhymeChecker, (line for line in lines if line.strip()), args)
+        write = _write_rhyme
+    else:
+        # check_corpus reads only a bounded number of poems ahead, so the copy kept for output stays small
+        poems, poems_to_check = tee(_read_poems(lines, args.per_line, args.segment))
+        results = PoemStructureChecker(args.data, args.polyphonic).check_corpus(poems_to_check, args.jobs, args.chunksize)
+        results = zip(poems, results)
+        write = _write_check
+
+    for result in results:
+        write(stdout, args.format, result)
+    stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
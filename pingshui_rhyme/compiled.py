@@ -0,0 +1,168 @@
+"""
+Compiled binary form of the ping-ze rhyme dictionary.
+
+The JSON dictionary is compiled into a flat table that can be memory-mapped and read without parsing: tones and
+rhyme categories are looked up by binary search over the mapped codepoints, so no index of the whole dictionary
+needs to be built before answering a query. All integers are little-endian. The file is laid out as:
+
+    header      magic, version, codepoint count, category ID count, category count, string table size,
+                CRC-32 of the JSON the table was compiled from
+    codepoints  uint32 per character, sorted
+    offsets     uint32 per character plus one, the start of each character's category IDs
+    ids         uint16 per category ID, the rhyme categories of each character in dictionary order
+    tones       uint8 per character, a bitmask of PING and ZE
+    strings     UTF-8, one "tone_type\\ttone_group\\tcategory\\tcharacters\\n" line per category ID
+
+Each section starts on a 4 byte boundary.
+"""
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+
+from .rhyme_data import DEFAULT_JSON_PATH, RhymeData, PING, ZE
+
+MAGIC = b'PSRB'
+VERSION = 2
+
+_HEADER = struct.Struct('<4s6I')
+
+
+def _padding(size):
+    return b'\0' * (-size % 4)
+
+
+def source_checksum(json_file_path):
+    """
+    Returns the CRC-32 of a JSON file, as recorded in the tables compiled from it.
+
+    Line endings are read as LF, so that a checkout with CRLF line endings still matches its table.
+    """
+    with open(json_file_path, 'rb') as f:
+        return zlib.crc32(f.read().replace(b'\r\n', b'\n'))
+
+
+def write_compiled(data, output_file, checksum=0):
+    """Writes the compiled table of a RhymeData to output_file, recording the checksum of its source JSON."""
+    tone_codes = {'ping': PING, 'ze': ZE}
+
+    # Collect the tone bitmask and category IDs of every character in dictionary order
+    tones = {}
+    ids = {}
+    for category_id, ((tone_type, tone_group, category), characters) in enumerate(zip(data.categories, data.members)):
+        for char in characters:
+            codepoint = ord(char)
+            tones[codepoint] = tones.get(codepoint, 0) | tone_codes.get(tone_type, 0)
+            ids.setdefault(codepoint, []).append(category_id)
+
+    codepoints = array('I', sorted(ids))
+    offsets = array('I', [0])
+    flat_ids = array('H')
+    for codepoint in codepoints:
+        flat_ids.extend(ids[codepoint])
+        offsets.append(len(flat_ids))
+    tone_masks = bytes(tones[codepoint] for codepoint in codepoints)
+
+    strings = ''.join(
+        '\t'.join(category) + '\t' + characters + '\n'
+        for category, characters in zip(data.categories, data.members)
+    ).encode('utf-8')
+
+    if sys.byteorder != 'little':
+        for section in (codepoints, offsets, flat_ids):
+            section.byteswap()
+
+    sections = [codepoints.tobytes(), offsets.tobytes(), flat_ids.tobytes(), tone_masks]
+    with open(output_file, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(codepoints), len(flat_ids), len(data.categories), len(strings), checksum))
+        for section in sections:
+            f.write(section)
+            f.write(_padding(len(section)))
+        f.write(strings)
+
+
+class CompiledTable:
+    """
+    A memory-mapped compiled table.
+
+    codepoints, offsets, ids and tones are memoryviews over the mapped file, so opening a table reads nothing but the header.
+    """
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError("Compiled rhyme data can only be memory-mapped on little-endian platforms.")
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, count, id_count, category_count, strings_size, checksum = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} compiled rhyme dictionary.")
+
+        position = _HEADER.size
+
+        def section(size, fmt):
+            nonlocal position
+            start = position
+            position += size + (-size % 4)
+            return view[start:start + size].cast(fmt)
+
+        self.codepoints = section(4 * count, 'I')
+        self.offsets = section(4 * (count + 1), 'I')
+        self.ids = section(2 * id_count, 'H')
+        self.tones = section(count, 'B')
+        self._strings = view[position:position + strings_size]
+        self.category_count = category_count
+        self.checksum = checksum
+
+    def find(self, codepoint):
+        """Returns the position of a codepoint in the table, or None if the table doesn't list it."""
+        i = bisect_left(self.codepoints, codepoint)
+        if i == len(self.codepoints) or self.codepoints[i] != codepoint:
+            return None
+        return i
+
+    def category_ids(self, i):
+        """Returns the category IDs of the character at position i, in dictionary order."""
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def read_categories(self):
+        """Returns the categories and the characters of each category, in category ID order."""
+        categories = []
+        members = []
+        for line in bytes(self._strings).decode('utf-8').split('\n')[:-1]:
+            tone_type, tone_group, category, characters = line.split('\t')
+            categories.append((tone_type, tone_group, category))
+            members.append(characters)
+        return tuple(categories), tuple(members)
+
+
+def load_compiled(path):
+    """Loads a RhymeData backed by a memory-mapped compiled table."""
+    table = CompiledTable(path)
+    categories, members = table.read_categories()
+    return RhymeData(categories, members, path, table)
+
+
+def compile_rhyme_data(json_file_path=None, output_file=None):
+    """
+    Compiles a JSON rhyme dictionary into the binary format.
+
+    Defaults to compiling the JSON in the package data folder into the package data folder.
+    """
+    if json_file_path is None:
+        json_file_path = DEFAULT_JSON_PATH
+    if output_file is None:
+        output_file = os.path.splitext(json_file_path)[0] + '.bin'
+
+    write_compiled(RhymeData.from_json(json_file_path), output_file, source_checksum(json_file_path))
+    return output_file
+
+
+if __name__ == "__main__":
+    output_file = compile_rhyme_data(*sys.argv[1:3])
+    print(f"Compiled rhyme dictionary saved to {output_file}.")
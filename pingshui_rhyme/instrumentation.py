@@ -0,0 +1,185 @@
+"""
+Optional instrumentation of the checking pipeline.
+
+While enabled, the main stages of the checks (cleaning, classification, the rhyming rules, the meter checks and
+the public check methods) record their call counts and cumulative time, and classification counts how many
+characters were found in the rhyme data. Enabling swaps timed wrappers in for those methods and disabling puts
+the originals back, so instrumentation costs nothing while disabled.
+
+    from pingshui_rhyme import instrumentation
+
+    with instrumentation.profile() as stats:
+        checker.check_poem(poem)
+    print(stats['stages']['classify'])
+
+Instrumentation is per process: workers started by check_corpus or an executor are not instrumented.
+"""
+import functools
+import threading
+import warnings
+from contextlib import contextmanager
+from time import perf_counter
+
+from .cache import _caches
+from .classifier import PingZeClassifier, UNKNOWN
+from .meter import MeterEngine
+from .poem_structure_checker import PoemStructureChecker
+from .rhymechecker import RhymeChecker
+
+# The (class, method name, stage name) of each instrumented method
+STAGES = [
+    (PoemStructureChecker, 'check_poem_rhyming', 'check_poem_rhyming'),
+    (PoemStructureChecker, 'check_poem_pingze_meter', 'check_poem_pingze_meter'),
+    (PoemStructureChecker, '_normalize', 'clean_poem.normalize'),
+    (PoemStructureChecker, '_split_lines', 'clean_poem.split'),
+    (PoemStructureChecker, '_check_rhyming_endings', 'rhyming.rules'),
+    (PingZeClassifier, 'classify_codes', 'classify'),
+    (RhymeChecker, 'do_rhyme', 'do_rhyme'),
+    (MeterEngine, 'match_scheme_bits', 'meter.patterns'),
+    (MeterEngine, 'alternation_mismatch', 'meter.alternation'),
+]
+
+_lock = threading.Lock()
+_originals = {}
+_stages = {}
+_lookups = {'hits': 0, 'misses': 0}
+_hooks = []
+
+
+def _record(stage, elapsed):
+    with _lock:
+        counters = _stages.get(stage)
+        if counters is None:
+            counters = _stages[stage] = [0, 0.0]
+        counters[0] += 1
+        counters[1] += elapsed
+    for hook in _hooks:
+        # A failing hook must not replace the result or the exception of the instrumented call
+        try:
+            hook(stage, elapsed)
+        except Exception as error:
+            warnings.warn(f"Instrumentation hook {hook!r} raised {error!r}", RuntimeWarning)
+
+
+def _timed(stage, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _record(stage, perf_counter() - start)
+    return wrapper
+
+
+def _timed_classify(stage, method):
+    @functools.wraps(method)
+    def wrapper(self, sentence, *args, **kwargs):
+        start = perf_counter()
+        codes = method(self, sentence, *args, **kwargs)
+        elapsed = perf_counter() - start
+
+        misses = codes.count(UNKNOWN)
+        with _lock:
+            _lookups['hits'] += len(codes) - misses
+            _lookups['misses'] += misses
+        _record(stage, elapsed)
+        return codes
+    return wrapper
+
+
+def enable():
+    """Starts recording. Counters keep their values from earlier recordings until reset."""
+    with _lock:
+        if _originals:
+            return
+        for cls, name, stage in STAGES:
+            method = cls.__dict__[name]
+            _originals[cls, name] = method
+            wrap = _timed_classify if name == 'classify_codes' else _timed
+            setattr(cls, name, wrap(stage, method))
+
+
+def disable():
+    """Stops recording and restores the uninstrumented methods."""
+    with _lock:
+        for (cls, name), method in _originals.items():
+            setattr(cls, name, method)
+        _originals.clear()
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def add_hook(hook):
+    """
+    Calls hook(stage, seconds) after each recorded call, e.g. to export timings to a metrics system.
+
+    Exceptions raised by the hook are turned into RuntimeWarnings, so they never change what the call returns or raises.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def snapshot():
+    """
+    Returns a copy of the current counters as a dict of:
+
+    - 'stages': for each stage called so far, its number of 'calls' and cumulative 'time' in seconds
+    - 'lookups': the number of classified characters found ('hits') and not found ('misses') in the rhyme data
+    - 'caches': the hits, misses and evictions summed over every live result cache, and their total size
+    """
+    with _lock:
+        stages = {stage: {'calls': calls, 'time': elapsed} for stage, (calls, elapsed) in _stages.items()}
+        lookups = dict(_lookups)
+
+    caches = {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0}
+    for cache in list(_caches):
+        for key, value in cache.stats().items():
+            if key in caches:
+                caches[key] += value
+    return {'stages': stages, 'lookups': lookups, 'caches': caches}
+
+
+def diff(after, before):
+    """Returns the counters of snapshot after minus those of snapshot before, e.g. to get the stats of one batch."""
+    result = {}
+    for key, value in after.items():
+        if isinstance(value, dict):
+            result[key] = diff(value, before.get(key, {}))
+        elif key == 'size':
+            result[key] = value
+        else:
+            result[key] = value - before.get(key, 0)
+    return result
+
+
+def reset():
+    """Sets every stage and lookup counter back to zero. Cache counters are reset with each cache's clear()."""
+    with _lock:
+        _stages.clear()
+        _lookups['hits'] = _lookups['misses'] = 0
+
+
+@contextmanager
+def profile():
+    """
+    Records the calls made within the block, yielding a dict that holds their counters on exit.
+
+    The dict has the layout of snapshot, counting only what happened within the block. Recording stays
+    enabled after the block if it was enabled before it.
+    """
+    was_enabled = is_enabled()
+    before = snapshot()
+    stats = {}
+    enable()
+    try:
+        yield stats
+    finally:
+        if not was_enabled:
+            disable()
+        stats.update(diff(snapshot(), before))
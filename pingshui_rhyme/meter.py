@@ -0,0 +1,171 @@
+from .rhyme_data import PING, ZE, BOTH, _set_bits
+
+# Translate tone codes into '1' where the code includes the tone and '0' elsewhere
+_PING_BITS = bytes(b'1'[0] if code & PING else b'0'[0] for code in range(256))
+_ZE_BITS = bytes(b'1'[0] if code & ZE else b'0'[0] for code in range(256))
+
+
+def tone_bits(codes, tone):
+    """
+    Returns an int with bit i set where codes[i] includes the given tone (PING or ZE).
+    """
+    if not codes:
+        return 0
+    bits = codes.translate(_PING_BITS if tone == PING else _ZE_BITS)
+    # The first code is the lowest bit
+    return int(bits[::-1], 2)
+
+
+class MeterViolation:
+    """A character whose tone differs from the one a ping-ze scheme expects, as found by PoemStructureChecker.closest_meter_patterns."""
+    __slots__ = ('line', 'position', 'character', 'expected', 'suggestions')
+
+    def __init__(self, line, position, character, expected, suggestions):
+        # The 0-based line and position of the character, and the tone ('ping' or 'ze') expected there
+        self.line = line
+        self.position = position
+        self.character = character
+        self.expected = expected
+        # Characters of the expected tone that could replace it, as a string
+        self.suggestions = suggestions
+
+    def __repr__(self):
+        return f"MeterViolation(line {self.line + 1}, position {self.position + 1}, {self.character!r} should be {self.expected})"
+
+
+class SchemeDistance:
+    """How far a poem is from one ping-ze scheme: the scheme name and the tuple of its MeterViolations, in poem order."""
+    __slots__ = ('scheme', 'violations')
+
+    def __init__(self, scheme, violations):
+        self.scheme = scheme
+        self.violations = violations
+
+    @property
+    def distance(self):
+        """The number of characters whose tone differs from the scheme's."""
+        return len(self.violations)
+
+    def __repr__(self):
+        return f"SchemeDistance({self.scheme!r}, distance {self.distance}, {list(self.violations)!r})"
+
+
+class CompiledScheme:
+    """One ping-ze scheme compiled into bitmasks of the positions that must be ping and ze."""
+    __slots__ = ('name', 'ping_mask', 'ze_mask', 'line_count')
+
+    def __init__(self, name, expected_patterns, characters_per_line):
+        self.name = name
+        self.ping_mask = 0
+        self.ze_mask = 0
+        self.line_count = len(expected_patterns)
+
+        for i, expected_pattern in enumerate(expected_patterns):
+            for j, tone in enumerate(expected_pattern):
+                # 王士禎《律詵定體》 "凡七言第一字俱不論"
+                # For seven-character poems, the first character of each line is not considered.
+                if characters_per_line == 7 and j == 0:
+                    continue
+                bit = 1 << (i * characters_per_line + j)
+                if tone == '平':
+                    self.ping_mask |= bit
+                elif tone == '仄':
+                    self.ze_mask |= bit
+
+
+class MeterEngine:
+    """
+    Checks the ping-ze meter of a poem against precompiled patterns.
+
+    The poem is classified once into tone codes, and each scheme is then tested with a few bitwise operations
+    on the whole poem instead of comparing each line's pattern strings.
+    """
+
+    def __init__(self, patterns):
+        # Compile the patterns of PoemStructureChecker._generate_patterns, keeping their order
+        self.schemes = {
+            characters_per_line: [
+                CompiledScheme(name, expected_patterns, characters_per_line)
+                for name, expected_patterns in schemes.items()
+            ]
+            for characters_per_line, schemes in patterns.items()
+        }
+
+    def match_scheme(self, line_codes, characters_per_line):
+        """
+        Returns the name of the first scheme the poem follows, or None if it follows none of them.
+
+        line_codes holds the tone codes of each line. Lines of the wrong length, and characters of unknown tone, never match.
+        A character coded BOTH has both tone bits set, so it matches wherever either tone is expected.
+        """
+        if any(len(codes) != characters_per_line for codes in line_codes):
+            return None
+
+        codes = b''.join(line_codes)
+        return self.match_scheme_bits(tone_bits(codes, PING), tone_bits(codes, ZE), len(line_codes), characters_per_line)
+
+    def match_scheme_bits(self, ping, ze, line_count, characters_per_line):
+        """
+        Like match_scheme, given the tone_bits of the whole poem, whose lines must all have characters_per_line characters.
+        """
+        considered = (1 << (line_count * characters_per_line)) - 1
+
+        for scheme in self.schemes.get(characters_per_line, ()):
+            if line_count > scheme.line_count:
+                continue
+            # Every considered position must have the tone the scheme expects there
+            if scheme.ping_mask & considered & ~ping or scheme.ze_mask & considered & ~ze:
+                continue
+            return scheme.name
+
+        return None
+
+    def nearest_schemes(self, ping, ze, line_count, characters_per_line, k=None):
+        """
+        Ranks the schemes by their Hamming distance to a poem, given its tone_bits as for match_scheme_bits.
+
+        The distance to a scheme is the number of considered positions whose tone is not the one the scheme expects,
+        counted with a popcount of the scheme's masks against the poem's bits. Returns up to k (scheme name, violations)
+        pairs, nearest first with ties in scheme order, where violations is a tuple of the 0-based (line, position,
+        expected tone code) of each such position, in poem order.
+        """
+        considered = (1 << (line_count * characters_per_line)) - 1
+
+        ranked = []
+        for scheme in self.schemes.get(characters_per_line, ()):
+            if line_count > scheme.line_count:
+                continue
+            ping_missing = scheme.ping_mask & considered & ~ping
+            ze_missing = scheme.ze_mask & considered & ~ze
+            ranked.append((bin(ping_missing | ze_missing).count('1'), scheme.name, ping_missing, ze_missing))
+        # The sort is stable, so schemes at the same distance keep their order
+        ranked.sort(key=lambda entry: entry[0])
+
+        nearest = []
+        for _, name, ping_missing, ze_missing in ranked[:k]:
+            # A position expects exactly one tone, so the two masks never share a bit
+            missing = sorted([(bit, PING) for bit in _set_bits(ping_missing)] + [(bit, ZE) for bit in _set_bits(ze_missing)])
+            nearest.append((name, tuple(divmod(bit, characters_per_line) + (tone,) for bit, tone in missing)))
+        return nearest
+
+    def alternation_mismatch(self, line_codes, characters_per_line):
+        """
+        Checks the less restrictive alternation of the 2nd, 4th and 6th characters between each pair of lines.
+
+        Returns the 0-based (line, position) of the first character whose tone is the same as in its paired line,
+        or None if the tones alternate throughout. A character coded BOTH can take either tone, so it always alternates.
+        """
+        # 釋真空《新編篇韻貫珠集》 "一三五不論，二四六分明"
+        if characters_per_line == 7:
+            tone_positions = (1, 3, 5)  # 0-based indexing
+        else:
+            tone_positions = (1, 3)  # 5-character lines only have two positions to check
+
+        for i in range(0, len(line_codes) - 1, 2):
+            codes1 = line_codes[i]
+            codes2 = line_codes[i + 1]
+            for pos in tone_positions:
+                if codes1[pos] == codes2[pos] != BOTH:
+                    return i, pos
+
+        return None
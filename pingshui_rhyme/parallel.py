@@ -0,0 +1,33 @@
+import os
+from collections import deque
+from itertools import islice
+
+
+def _run_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def bounded_imap(pool, func, iterable, chunksize, processes=None):
+    """
+    Like pool.imap, but reads ahead at most two chunks per worker process.
+
+    Pool.imap queues the whole input iterable as fast as it can read it, so its memory grows with the input.
+    Here a chunk is only read once an earlier one has been collected. Results are yielded in input order.
+    func must be picklable, e.g. a module-level function.
+    """
+    max_pending = 2 * (processes or os.cpu_count() or 1)
+    iterator = iter(iterable)
+    pending = deque()
+
+    while True:
+        while len(pending) < max_pending:
+            chunk = list(islice(iterator, chunksize))
+            if not chunk:
+                break
+            pending.append(pool.apply_async(_run_chunk, (func, chunk)))
+
+        if not pending:
+            return
+
+        for result in pending.popleft().get():
+            yield result
@@ -1,12 +1,50 @@
 import re
-from .classifier import PingZeClassifier
+from functools import partial
+from .classifier import PingZeClassifier, PING, ZE, TONE_NAMES
+from .rhyme_data import _books, _set_bits
 from .rhymechecker import RhymeChecker
+from .meter import MeterEngine, MeterViolation, SchemeDistance, tone_bits
+from .parallel import bounded_imap
+from .cache import VerdictCache
+from .segmenter import PUNCTUATION
+
+# Runs of punctuation and whitespace, which separate the lines of a poem
+_SEPARATORS = re.compile('[' + PUNCTUATION + r'\s]+')
+
+# The passing results, which are immutable and so returned as the same shared tuples by every check
+_RHYMING_FOLLOWED = {poem_type: (True, f"Poem follows {poem_type} rhyming rules.") for poem_type in ('jueju', 'lushi')}
+_ALTERNATION_FOLLOWED = (True, "Poem follows the less restrictive ping-ze alternation pattern in 2nd, 4th, and 6th characters.")
 
 class PoemStructureChecker:
-    def __init__(self):
-        self.classifier = PingZeClassifier()
-        self.rhyme_checker = RhymeChecker()
-        self.patterns = self._generate_patterns()
+    # The patterns are the same for every checker, so they are generated and compiled once and shared
+    _shared_patterns = None
+    _shared_meter = None
+    _shared_verdicts = None
+
+    def __init__(self, json_file_path=None, polyphonic=False, cache_size=None, cache_policy='lru'):
+        self.json_file_path = json_file_path
+
+        # Whether the meter check lets characters listed under both ping and ze, such as 看, take either tone
+        self.polyphonic = polyphonic
+
+        # Both share the same loaded rhyme dictionary
+        self.classifier = PingZeClassifier(json_file_path)
+        self.rhyme_checker = RhymeChecker(json_file_path)
+
+        if PoemStructureChecker._shared_patterns is None:
+            PoemStructureChecker._shared_patterns = self._generate_patterns()
+            PoemStructureChecker._shared_meter = MeterEngine(PoemStructureChecker._shared_patterns)
+            PoemStructureChecker._shared_verdicts = {
+                scheme: (True, f"Poem follows {scheme} ping-ze pattern.")
+                for schemes in PoemStructureChecker._shared_patterns.values() for scheme in schemes
+            }
+        self.patterns = PoemStructureChecker._shared_patterns
+        self.meter = PoemStructureChecker._shared_meter
+
+        # Optional cache of check results, keyed on the normalized poem so that formatting differences still hit
+        self.cache_size = cache_size
+        self.cache_policy = cache_policy
+        self.cache = VerdictCache(cache_size, cache_policy) if cache_size else None
 
     def _generate_patterns(self):
         # Define the line structures for both 5 and 7-character lines
@@ -50,35 +88,41 @@ class PoemStructureChecker:
     def clean_poem(self, poem):
         """
         Cleans and reformats a poem by:
-        - Removing any punctuation.
-        - Splitting the poem into individual lines based on punctuation or line length (5 or 7 characters).
-        - Stripping extra spaces or newlines.
+        - Splitting the poem into lines at punctuation and whitespace, including line breaks.
+        - Splitting any run of characters without punctuation into lines based on its length (5 or 7 characters).
+        - Removing the punctuation and whitespace.
         """
-        # Remove any punctuation (commas, periods, etc.)
-        poem = re.sub(r'[，。！？；：、]', '', poem)
-
-        # Strip extra whitespace or newlines
-        poem = poem.replace('\n', '').strip()
+        return self._split_lines(self._normalize(poem))
+
+    def _normalize(self, poem):
+        # Replace each run of punctuation and whitespace with a single newline, leaving only the line breaks
+        return _SEPARATORS.sub('\n', poem).strip('\n')
+
+    def _split_lines(self, poem):
+        lines = []
+        for run in poem.split('\n'):
+            if len(run) == 5 or len(run) == 7:
+                # Already a single line, as in most punctuated poems
+                lines.append(run)
+            elif run:
+                lines.extend(self._split_by_length(run))
+        return lines
 
+    def _split_by_length(self, run):
         # Automatically detect the character count per line (5 or 7 characters)
         # If the poem has no punctuation or spaces, split it based on typical 5 or 7 characters per line
-        length = len(poem)
-        
+        length = len(run)
+
         # Try splitting as 4 or 8 lines of 5 or 7 characters
         if length % 5 == 0:
             # 5-character poem
-            lines = [poem[i:i+5] for i in range(0, length, 5)]
+            return [run[i:i+5] for i in range(0, length, 5)]
         elif length % 7 == 0:
             # 7-character poem
-            lines = [poem[i:i+7] for i in range(0, length, 7)]
+            return [run[i:i+7] for i in range(0, length, 7)]
         else:
-            # Default: assume input is already spaced or punctuated and split by newlines
-            lines = poem.split('\n')
-
-        # Remove any leading or trailing whitespace from each line
-        lines = [line.strip() for line in lines if line.strip()]
-
-        return lines
+            # Default: the run is a single line
+            return [run]
 
     def pingze_zh_convert_to_en(self, pattern):
         return pattern.replace('平', 'ping').replace('仄', 'ze')
@@ -86,16 +130,48 @@ class PoemStructureChecker:
     def pingze_en_convert_to_zh(self, pattern):
         return pattern.replace('ping', '平').replace('ze', '仄')
 
-    def check_poem_rhyming(self, poem):
-        # Split the poem into lines
-        lines = self.clean_poem(poem)
+    def check_poem_rhyming(self, poem, book=None):
+        return self._check_cached('rhyming', self._check_poem_rhyming, poem, book)
+
+    def check_poem_pingze_meter(self, poem, book=None):
+        return self._check_cached('meter', self._check_poem_pingze_meter, poem, book)
+
+    def _check_cached(self, kind, check, poem, book=None):
+        """Runs check on the lines of a poem, going through the cache if there is one."""
+        normalized = self._normalize(poem)
+        if self.cache is None:
+            return check(self._split_lines(normalized), book)
+        return self.cache.get_or_compute((kind, book, normalized), lambda: check(self._split_lines(normalized), book))
+
+    def cache_stats(self):
+        """Returns the hit, miss and eviction counters of the cache, or None if caching is off."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def _check_poem_rhyming(self, lines, book=None):
+        shape_error = self._rhyming_shape_error(lines)
+        if shape_error is not None:
+            return shape_error
+
+        # Classify the ping-ze tone (平仄) of the last characters of each line, and look up their rhyme categories
+        endings = ''.join(line[-1] for line in lines)
+        rhyme_masks = self.rhyme_checker._data(book).rhyme_masks
+        return self._check_rhyming_endings(
+            self.classifier.classify_codes(endings, book=book),
+            [rhyme_masks[char] for char in endings],
+        )
+
+    def rhyme_scheme(self, poem, book=None):
+        """
+        Finds the rhyme runs and rhyme changes of a poem of any number of lines, such as a 排律 or 古體 poem.
+
+        Returns a RhymeScheme; see RhymeChecker.rhyme_scheme.
+        """
+        return self.rhyme_checker.rhyme_scheme([line[-1] for line in self.clean_poem(poem)], book)
 
+    def _rhyming_shape_error(self, lines):
+        """Returns the failed result if the poem doesn't have the line count and line length needed to check its rhyming, else None."""
         # Determine if it's a Jueju (4 lines) or Lushi (8 lines)
-        if len(lines) == 4:
-            poem_type = 'jueju'
-        elif len(lines) == 8:
-            poem_type = 'lushi'
-        else:
+        if len(lines) not in (4, 8):
             return False, "Poem must have either 4 lines (Jueju) or 8 lines (Lushi)."
 
         # Determine if it's 5-character or 7-character
@@ -103,13 +179,21 @@ class PoemStructureChecker:
         if characters_per_line not in [5, 7]:
             return False, "Each line must have 5 or 7 characters."
 
-        # Classify the ping-ze tone (平仄) of the last characters of each line
-        pattern = [self.classifier.classify(line[-1]) for line in lines]
+        return None
+
+    def _check_rhyming_endings(self, pattern, masks):
+        """
+        Checks the rhyming rules given the last character of each line of a 4 or 8-line poem.
+
+        pattern holds the tone code of each last character and masks their rhyme category bitmasks;
+        two characters rhyme if their bitmasks share a bit.
+        """
+        poem_type = 'jueju' if len(pattern) == 4 else 'lushi'
 
         # 1. Check first line: it can either rhyme or not
-        if pattern[0][0] == 'ping':
+        if pattern[0] == PING:
             first_line_rhymes = True  # If the first line ends in ping, it may rhyme
-        elif pattern[0][0] == 'ze':
+        elif pattern[0] == ZE:
             first_line_rhymes = False  # If first line ends in ze, that character can't rhyme
         else:
             return False, "First line's last character must be either ping or ze."
@@ -117,48 +201,43 @@ class PoemStructureChecker:
         # 2. Check rhyming lines
         if poem_type == 'jueju':
             # Jueju: Check second and fourth lines for rhyming
-            if pattern[1][0] != 'ping' or pattern[3][0] != 'ping':
+            if pattern[1] != PING or pattern[3] != PING:
                 return False, "Second and fourth lines must end with ping characters."
-            char2 = lines[1][-1]
-            char4 = lines[3][-1]
-            if not self.rhyme_checker.do_rhyme(char2, char4):
+            if not masks[1] & masks[3]:
                 return False, "Second and fourth lines must rhyme."
 
             # Optionally, check if the first line rhymes with the second and fourth lines
             if first_line_rhymes:
-                char1 = lines[0][-1]
-                if not self.rhyme_checker.do_rhyme(char1, char2):
+                if not masks[0] & masks[1]:
                     return False, "First line must rhyme with the second and fourth lines if it uses ping."
 
             # Check third line: must end with ze
-            if pattern[2][0] != 'ze':
+            if pattern[2] != ZE:
                 return False, "Third line must end with a ze character."
 
         elif poem_type == 'lushi':
             # Lushi: Check second, fourth, sixth, and eighth lines for rhyming
             for i in [1, 3, 5, 7]:
-                if pattern[i][0] != 'ping':
+                if pattern[i] != PING:
                     return False, f"Line {i+1} must end with a ping character."
-            
-            char2 = lines[1][-1]
+
             for i in [3, 5, 7]:
-                if not self.rhyme_checker.do_rhyme(char2, lines[i][-1]):
+                if not masks[1] & masks[i]:
                     return False, f"Line {i+1} must rhyme with line 2."
-            
+
             # Except for line 1, odd-numbered lines (3, 5, 7) are not allowed to rhyme.
             for i in [2, 4, 6]:
-                if self.rhyme_checker.do_rhyme(char2, lines[i][-1]):
+                if masks[1] & masks[i]:
                     return False, f"Line {i+1} must not rhyme with line 2."
 
             # Optionally, check if the first line rhymes with the even lines if it ends in ping
             if first_line_rhymes:
-                char1 = lines[0][-1]
-                if not self.rhyme_checker.do_rhyme(char1, char2):
+                if not masks[0] & masks[1]:
                     return False, "First line must rhyme with even lines if it uses ping."
 
             # Check third, fifth, and seventh lines: must end with ze
             for i in [2, 4, 6]:
-                if pattern[i][0] != 'ze':
+                if pattern[i] != ZE:
                     return False, f"Line {i+1} must end with a ze character."
 
             # Ensure no three consecutive ping or ze in line endings
@@ -166,62 +245,202 @@ class PoemStructureChecker:
                 if pattern[i] == pattern[i+1] == pattern[i+2]:
                     return False, "No three consecutive ping or ze are allowed."
 
-        return True, f"Poem follows {poem_type} rhyming rules."
+        return _RHYMING_FOLLOWED[poem_type]
 
-    def check_poem_pingze_meter(self, poem):
-        # Clean the poem and split into lines
-        lines = self.clean_poem(poem)
+    def _check_poem_pingze_meter(self, lines, book=None):
+        # A poem of nothing but punctuation and whitespace has no lines to check
+        if not lines:
+            return False, "Poem has no lines."
+
+        length_error = self._line_length_error(lines)
+        if length_error is not None:
+            return length_error
+        characters_per_line = len(lines[0])
+
+        # Classify the whole poem once
+        line_codes = self._classify_lines(lines, book)
+
+        # Try all combinations of patterns: pingqi_ruyun, pingqi_buruyun, zeqi_ruyun, zeqi_buruyun
+        pattern_type = self.meter.match_scheme(line_codes, characters_per_line)
+
+        # If strict pattern checks fail, resort to the less restrictive 2nd, 4th, 6th character alternation check
+        mismatch = None
+        if pattern_type is None:
+            mismatch = self.meter.alternation_mismatch(line_codes, characters_per_line)
 
+        return self._meter_verdict(pattern_type, mismatch)
+
+    def _line_length_error(self, lines):
+        """Returns the failed meter result if the lines don't all have the same 5 or 7 characters, else None."""
         # Determine if it's 5-character or 7-character
         characters_per_line = len(lines[0])
         if characters_per_line not in [5, 7]:
             return False, "Each line must have 5 or 7 characters."
 
-        # Check both rhymed (ruyun) and non-rhymed (buruyun) patterns for both pingqi and zeqi
-        possible_patterns = self.patterns[characters_per_line]
+        # Lines split at punctuation can be shorter, such as a line still being typed, and can't be compared
+        if any(len(line) != characters_per_line for line in lines):
+            return False, f"Each line must have {characters_per_line} characters like the first line."
 
-        # Try all combinations of patterns: pingqi_ruyun, pingqi_buruyun, zeqi_ruyun, zeqi_buruyun
-        for pattern_type, expected_patterns in possible_patterns.items():
-            all_lines_match = True
-            for i, line in enumerate(lines):
-
-                # 王士禎《律詵定體》 "凡七言第一字俱不論"
-                # For seven-character poems, the first character of each line is not considered.
-                if characters_per_line == 7:
-                    # Replace the first character with a blank instead of removing it
-                    pingze_pattern = '〇' + ''.join([self.pingze_en_convert_to_zh(self.classifier.classify(char)[0]) for char in line[1:]])
-                    expected_pattern = '〇' + expected_patterns[i][1:]  # Add a space at the beginning to match
-                else:
-                    pingze_pattern = ''.join([self.pingze_en_convert_to_zh(self.classifier.classify(char)[0]) for char in line])
-                    expected_pattern = expected_patterns[i]
-
-                # Compare to the expected pattern
-                if pingze_pattern != expected_pattern:
-                    all_lines_match = False
-                    break
-
-            # If any one pattern type fully matches, return success
-            if all_lines_match:
-                return True, f"Poem follows {pattern_type} ping-ze pattern."
+        return None
 
-        # If strict pattern checks fail, resort to the less restrictive 2nd, 4th, 6th character alternation check
-        # 釋真空《新編篇韻貫珠集》 "一三五不論，二四六分明"
-        for i in range(0, len(lines) - 1, 2):
-            line1 = lines[i]
-            line2 = lines[i + 1]
-
-            # For 7-character lines, consider positions 2, 4, and 6
-            if characters_per_line == 7:
-                tone_positions = [1, 3, 5]  # 0-based indexing
-            else:
-                tone_positions = [1, 3]  # 5-character lines only have two positions to check
-
-            for pos in tone_positions:
-                tone1 = self.pingze_en_convert_to_zh(self.classifier.classify(line1[pos])[0])
-                tone2 = self.pingze_en_convert_to_zh(self.classifier.classify(line2[pos])[0])
-
-                # Check if tones are opposite: ping (平) and ze (仄)
-                if tone1 == tone2:
-                    return False, f"Ping ze tone mismatch between line {i+1} and line {i+2} at character position {pos+1}."
-
-        return True, "Poem follows the less restrictive ping-ze alternation pattern in 2nd, 4th, and 6th characters."
\ No newline at end of file
+    def _meter_verdict(self, pattern_type, mismatch):
+        """Describes the outcome of the meter check given the matched scheme, or else the first alternation mismatch."""
+        if pattern_type is not None:
+            return self._shared_verdicts[pattern_type]
+
+        if mismatch is not None:
+            i, pos = mismatch
+            return False, f"Ping ze tone mismatch between line {i+1} and line {i+2} at character position {pos+1}."
+
+        return _ALTERNATION_FOLLOWED
+
+    def _classify_lines(self, lines, book=None):
+        """Classifies all lines in one pass, returning the tone codes of each line."""
+        codes = self.classifier.classify_codes(''.join(lines), self.polyphonic, book)
+        line_codes = []
+        start = 0
+        for line in lines:
+            line_codes.append(codes[start:start + len(line)])
+            start += len(line)
+        return line_codes
+
+    def closest_meter_patterns(self, poem, k=None, suggestions=5, book=None):
+        """
+        Finds the ping-ze schemes nearest to a poem, with the characters that break each one and their possible replacements.
+
+        Each scheme for the poem's line length is compared with the poem's tones in a single pass. The distance to a
+        scheme is the number of characters whose tone differs from the one it expects (the Hamming distance), ignoring
+        the first character of 7-character lines like check_poem_pingze_meter. Returns the k nearest as SchemeDistance
+        objects, nearest first with ties in scheme order, so a poem that follows a scheme gets it first at distance 0.
+
+        Each MeterViolation suggests up to `suggestions` characters that would have the expected tone. Where the scheme
+        expects a rhyme, at the end of an even-numbered line or of the first line of a 入韻 scheme, they are taken from
+        the rhyme category the even-numbered lines share, keeping the rhyme. Elsewhere they come first from the
+        categories of the expected tone corresponding to the character's own rhyme (see RhymeData.counterparts), so
+        they sound alike but for the tone. Poems whose lines don't all have the same 5 or 7 characters, or that have
+        more than 8 lines, have no scheme to compare and give an empty list.
+        """
+        if k is not None and k < 0:
+            raise ValueError(f"k must be None or at least 0, not {k}")
+
+        lines = self.clean_poem(poem)
+        if not lines:
+            return []
+        characters_per_line = len(lines[0])
+        if any(len(line) != characters_per_line for line in lines):
+            return []
+
+        codes = b''.join(self._classify_lines(lines, book))
+        nearest = self.meter.nearest_schemes(tone_bits(codes, PING), tone_bits(codes, ZE), len(lines), characters_per_line, k)
+
+        # The same position often breaks several schemes, so each violation is only looked up once
+        violations = {}
+        results = []
+        for scheme, positions in nearest:
+            for position in positions:
+                if position not in violations:
+                    violations[position] = self._meter_violation(lines, position, suggestions, book)
+            results.append(SchemeDistance(scheme, tuple(violations[position] for position in positions)))
+        return results
+
+    def _meter_violation(self, lines, position, limit, book):
+        line, i, expected = position
+        character = lines[line][i]
+        data = self.rhyme_checker._data(book)
+
+        candidates = None
+        # Every scheme rhymes in ping, and expects ping at the end of exactly the lines that rhyme: the even-numbered
+        # lines, and the first line of 入韻 schemes
+        if expected == PING and i == len(lines[line]) - 1:
+            # Look for replacements in the categories the other even-numbered lines all have in common. If they
+            # share none, or there are no others, the suggestions are found as for any other position.
+            common = None
+            for j in range(1, len(lines), 2):
+                if j != line:
+                    mask = data.rhyme_masks[lines[j][-1]]
+                    common = mask if common is None else common & mask
+            if common:
+                candidates = ''.join(data.member_index[category_id] for category_id in _set_bits(common))
+        if candidates is None:
+            # Take the characters of the expected tone's categories corresponding to the character's rhyme first,
+            # then any others of that tone
+            tone_name = TONE_NAMES[expected]
+            categories = data.categories
+            counterparts = dict.fromkeys(
+                other
+                for category_id in _set_bits(data.rhyme_masks[character])
+                for other in data.counterparts[category_id]
+                if categories[other][0] == tone_name
+            )
+            candidates = ''.join(data.member_index[category_id] for category_id in counterparts) + data.tone_members[expected]
+
+        # Keep the candidates this checker would read as the expected tone, which depends on polyphonic for characters
+        # of both tones. They are looked up like classify_codes does but without calling it, so that instrumentation
+        # only counts the lookups of the poem's own characters.
+        codes = candidates.translate(data.tone_masks if self.polyphonic else data.tone_index).encode('latin-1')
+        replacements = []
+        for candidate, code in zip(candidates, codes):
+            if len(replacements) >= limit:
+                break
+            if code & expected and candidate != character and candidate not in replacements:
+                replacements.append(candidate)
+        return MeterViolation(line, i, character, TONE_NAMES[expected], ''.join(replacements))
+
+    def check_poem(self, poem, book=None):
+        """
+        Checks both the rhyming and the ping-ze meter of a poem.
+
+        Returns a (rhyming, meter) pair holding the results of check_poem_rhyming and check_poem_pingze_meter.
+        book checks against another rhyme book for this call only, given as a registered name, a data file path
+        or a RhymeData; the checker's own book is used by default.
+        """
+        return self.check_poem_rhyming(poem, book), self.check_poem_pingze_meter(poem, book)
+
+    def check_corpus(self, poems, processes=1, chunksize=64, book=None):
+        """
+        Checks every poem of an iterable, yielding the result of check_poem for each poem in input order.
+
+        Poems are read from the iterable and results are yielded as they become available, so the corpus never
+        has to fit in memory. With processes other than 1, poems are checked by a pool of that many worker
+        processes (None uses every CPU), which are sent chunksize poems at a time. Workers load book by its
+        name or path, so a RhymeData can only be given when checking in this process.
+        """
+        if processes == 1:
+            for poem in poems:
+                yield self.check_poem(poem, book)
+            return
+
+        # Workers started by fork inherit the rhyme data already loaded in this process, while spawned
+        # workers memory-map the compiled table, so the JSON is not parsed again in each worker.
+        # Build the lazily indexed rhyme bitmasks first so that forked workers inherit them too.
+        self.rhyme_checker.rhyme_masks
+        # multiprocessing takes a while to import, so it is only imported once a pool is needed
+        from multiprocessing import Pool
+        with Pool(processes, initializer=_init_worker, initargs=self._worker_args()) as pool:
+            check = _check_poem_in_worker if book is None else partial(_check_poem_in_worker, book=book)
+            for result in bounded_imap(pool, check, poems, chunksize, processes):
+                yield result
+
+    def _worker_args(self):
+        # Each worker gets a cache of its own configured like this one, and the rhyme books registered here, which
+        # workers started by spawn or forkserver don't inherit
+        return self.json_file_path, self.polyphonic, self.cache_size, self.cache_policy, tuple(sorted(_books.items()))
+
+
+# The checker used by each check_corpus worker process
+_worker_checker = None
+
+
+def _build_worker_checker(json_file_path, polyphonic, cache_size=None, cache_policy='lru', books=()):
+    """Builds the checker of a worker process from the _worker_args of the checker it works for."""
+    _books.update(books)
+    return PoemStructureChecker(json_file_path, polyphonic, cache_size, cache_policy)
+
+
+def _init_worker(*worker_args):
+    global _worker_checker
+    _worker_checker = _build_worker_checker(*worker_args)
+
+
+def _check_poem_in_worker(poem, book=None):
+    return _worker_checker.check_poem(poem, book)
@@ -0,0 +1,474 @@
+import os
+import threading
+import warnings
+from types import MappingProxyType
+
+# Tone codes used by PingZeClassifier.classify_codes, where BOTH is PING | ZE
+UNKNOWN = 0
+PING = 1
+ZE = 2
+BOTH = 3
+
+# Tone names indexed by tone code
+TONE_NAMES = ('unknown', 'ping', 'ze', 'both')
+
+# Maps a PING/ZE bitmask to the tone code reported for it, where ping is checked first
+_FIRST_MATCH_CODES = bytes([UNKNOWN, PING, ZE, PING]) + bytes(252)
+
+
+class _ToneTable(dict):
+    """
+    Maps codepoints to tone codes for use with str.translate.
+
+    Codepoints that are not in the table translate to UNKNOWN instead of being passed through unchanged.
+    """
+    __slots__ = ()
+
+    def __missing__(self, codepoint):
+        return UNKNOWN
+
+
+class _RhymeMasks(dict):
+    """Maps characters to rhyme category bitmasks, where characters that are not in the data have the empty bitmask 0."""
+    __slots__ = ()
+
+    def __missing__(self, char):
+        return 0
+
+
+class _MappedIndex(dict):
+    """
+    An index over a compiled table that reads each entry from the memory-mapped table on first lookup.
+
+    read(key) returns the entry of a key, or None if the table doesn't list it. Entries that are found are kept,
+    so later lookups are plain dictionary lookups; keys the table doesn't list give default, or raise KeyError if
+    default is None. Iterating the index only gives the entries looked up so far.
+    """
+    __slots__ = ('_read', '_default')
+
+    def __init__(self, read, default=None):
+        super().__init__()
+        self._read = read
+        self._default = default
+
+    def _lookup(self, key):
+        value = self._read(key)
+        if value is not None:
+            self[_share(key)] = value
+        return value
+
+    def __missing__(self, key):
+        value = self._lookup(key)
+        if value is None:
+            if self._default is None:
+                raise KeyError(key)
+            return self._default
+        return value
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self._lookup(key) is not None
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+# One key object per character and per codepoint, shared by the indexes of the loaded rhyme books, so that books
+# loaded side by side don't each hold their own copy of the characters they have in common. Cleared together with
+# the loaded books by clear_rhyme_data.
+_shared_keys = {}
+
+
+def _share(key):
+    return _shared_keys.setdefault(key, key)
+
+
+# Held while building an index, so that threads racing on first use build each index only once. Builds may use
+# other indexes, hence a reentrant lock.
+_build_lock = threading.RLock()
+
+
+def _set_bits(mask):
+    """Yields the indexes of the bits set in an int in increasing order, e.g. the category IDs of a rhyme bitmask."""
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        yield bit.bit_length() - 1
+
+
+class _lazy:
+    """
+    Computes an attribute on first access and stores it on the instance.
+
+    Later reads find the stored value in the instance dictionary without going through the descriptor,
+    so only the first access takes the lock.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with _build_lock:
+            value = instance.__dict__.get(self.name)
+            if value is None:
+                value = self.build(instance)
+                instance.__dict__[self.name] = value
+        return value
+
+
+def _read_only(value):
+    """Returns a read-only version of a value: dicts become mapping proxies and lists tuples, recursively."""
+    if isinstance(value, dict):
+        if any(isinstance(item, (dict, list)) for item in value.values()):
+            value = {key: _read_only(item) for key, item in value.items()}
+        return MappingProxyType(value)
+    if isinstance(value, list):
+        return tuple(_read_only(item) for item in value)
+    return value
+
+
+class RhymeData:
+    """
+    Indexed form of a ping-ze rhyme book.
+
+    Every book has the same compact form, whatever its source: a tone code and a bitmask of rhyme category IDs
+    per character. Instances are built once per data file by load_rhyme_data and shared by every classifier and
+    checker that uses that file, so they must be treated as read-only. Indexes are built on first use; when the
+    data comes from a compiled table, the tone and rhyme indexes instead read each character from the
+    memory-mapped file on its first lookup, so no index of the whole dictionary is built to answer a query.
+
+    No entry ever changes once it has been read, so every read is lock-free and reentrant, and the indexes can be
+    shared by any number of threads. Classifiers and checkers hand callers the read-only views returned by view().
+    """
+
+    def __init__(self, categories, members, path=None, table=None):
+        # One (tone_type, tone_group, rhyme_category) tuple per rhyme category
+        self.categories = categories
+        # The characters of each rhyme category, in dictionary order
+        self.members = members
+        self.path = path
+        self.table = table
+
+    @classmethod
+    def from_json(cls, json_file_path):
+        """
+        Loads a rhyme book from a JSON file.
+
+        The file holds either the nested tone_type -> tone_group -> rhyme_category -> [characters] dictionary of
+        the packaged data, or a flat list of categories, for books such as 詞林正韻 whose groups don't nest that way:
+
+            {"categories": [{"tone": "ping", "group": "第一部", "category": "第一部平聲", "characters": "東同…"}, …]}
+
+        tone must be 'ping' or 'ze' for the characters to be classified.
+        """
+        # Imported here so that loading a compiled table doesn't pay for the json module
+        import json
+
+        with open(json_file_path, 'r', encoding='utf-8') as file:
+            book = json.load(file)
+
+        categories = []
+        members = []
+        if isinstance(book, dict) and isinstance(book.get('categories'), list):
+            for record in book['categories']:
+                categories.append((record['tone'], record['group'], record['category']))
+                members.append(''.join(record['characters']))
+            return cls(tuple(categories), tuple(members), json_file_path)
+
+        for tone_type in book:
+            for tone_group in book[tone_type]:
+                for rhyme_category, characters in book[tone_type][tone_group].items():
+                    categories.append((tone_type, tone_group, rhyme_category))
+                    members.append(''.join(characters))
+
+        data = cls(tuple(categories), tuple(members), json_file_path)
+        data.ping_ze_dict = book
+        return data
+
+    def view(self, name):
+        """
+        Returns a read-only view of the named index, e.g. 'rhyme_dict', built once and shared by every caller.
+
+        Dictionaries are wrapped in mapping proxies, and the nested ping_ze_dict is converted into nested proxies
+        holding tuples, so callers cannot modify the shared data.
+        """
+        views = self._views
+        view = views.get(name)
+        if view is None:
+            view = views.setdefault(name, _read_only(getattr(self, name)))
+        return view
+
+    @_lazy
+    def _views(self):
+        return {}
+
+    @_lazy
+    def ping_ze_dict(self):
+        """The nested tone_type -> tone_group -> rhyme_category -> [characters] dictionary."""
+        ping_ze_dict = {}
+        for (tone_type, tone_group, rhyme_category), characters in zip(self.categories, self.members):
+            ping_ze_dict.setdefault(tone_type, {}).setdefault(tone_group, {})[rhyme_category] = [characters]
+        return ping_ze_dict
+
+    @_lazy
+    def ping_characters(self):
+        """All characters in the ping section, collapsed into a string."""
+        return self._collapse('ping')
+
+    @_lazy
+    def ze_characters(self):
+        """All characters in the ze section, collapsed into a string."""
+        return self._collapse('ze')
+
+    def _collapse(self, tone_type):
+        return ''.join([characters for category, characters in zip(self.categories, self.members) if category[0] == tone_type])
+
+    @_lazy
+    def tone_index(self):
+        """
+        A table mapping each character's codepoint to its tone code.
+
+        Characters listed under both ping and ze are indexed as ping, since ping is checked first.
+        """
+        if self.table is not None:
+            return _MappedIndex(self._read_tone_code, UNKNOWN)
+
+        tone_index = _ToneTable()
+        for char in self.ze_characters:
+            tone_index[_share(ord(char))] = ZE
+        for char in self.ping_characters:
+            tone_index[_share(ord(char))] = PING
+        return tone_index
+
+    @_lazy
+    def tone_masks(self):
+        """
+        A table mapping each character's codepoint to the bitmask of every tone it is listed under.
+
+        Characters listed under both ping and ze, such as 看, are indexed as BOTH.
+        """
+        if self.table is not None:
+            return _MappedIndex(self._read_tone_mask, UNKNOWN)
+
+        tone_masks = _ToneTable()
+        for char in self.ping_characters:
+            tone_masks[_share(ord(char))] = PING
+        for char in self.ze_characters:
+            codepoint = _share(ord(char))
+            tone_masks[codepoint] = tone_masks[codepoint] | ZE
+        return tone_masks
+
+    def _read_tone_mask(self, codepoint):
+        i = self.table.find(codepoint)
+        return None if i is None else self.table.tones[i]
+
+    def _read_tone_code(self, codepoint):
+        i = self.table.find(codepoint)
+        return None if i is None else _FIRST_MATCH_CODES[self.table.tones[i]]
+
+    def _read_category_ids(self, char):
+        if not isinstance(char, str) or len(char) != 1:
+            return None
+        i = self.table.find(ord(char))
+        return None if i is None else self.table.category_ids(i)
+
+    def tone_mask_items(self):
+        """Returns an iterable of the (codepoint, tone bitmask) of every character in the data, in no particular order."""
+        if self.table is not None:
+            return zip(self.table.codepoints, self.table.tones)
+        return self.tone_masks.items()
+
+    @_lazy
+    def tone_members(self):
+        """Maps PING and ZE to the characters listed under that tone only, in dictionary order without repeats."""
+        tone_masks = self.tone_masks
+        return {
+            tone: ''.join(char for char in dict.fromkeys(characters) if tone_masks[ord(char)] == tone)
+            for tone, characters in ((PING, self.ping_characters), (ZE, self.ze_characters))
+        }
+
+    @_lazy
+    def polyphones(self):
+        """The set of characters listed under both ping and ze."""
+        return frozenset(chr(codepoint) for codepoint, mask in self.tone_mask_items() if mask == BOTH)
+
+    @_lazy
+    def rhyme_dict(self):
+        """
+        A dictionary where the keys are characters, and the values are tuples of their rhyme groups.
+
+        Each rhyme group is the same (tone_type, tone_group, rhyme_category) tuple for all of its characters.
+        """
+        if self.table is not None:
+            return _MappedIndex(self._read_rhyme_groups)
+
+        rhyme_dict = {}
+        for rhyme_group, characters in zip(self.categories, self.members):
+            for char in map(_share, characters):
+                rhyme_dict[char] = rhyme_dict.get(char, ()) + (rhyme_group,)
+        return rhyme_dict
+
+    @_lazy
+    def category_ids(self):
+        """Maps each (tone_type, tone_group, rhyme_category) tuple to its integer category ID."""
+        return {category: category_id for category_id, category in enumerate(self.categories)}
+
+    @_lazy
+    def member_index(self):
+        """
+        Maps each rhyme category and tone group to its characters, in dictionary order without repeats.
+
+        Categories can be looked up by integer category ID, by (tone_type, tone_group, rhyme_category) tuple or by
+        name, e.g. '上平聲一東', and tone groups by name, e.g. '上平聲部'.
+        """
+        member_index = {}
+        group_members = {}
+        for category_id, (category, characters) in enumerate(zip(self.categories, self.members)):
+            characters = ''.join(dict.fromkeys(characters))
+            member_index[category_id] = member_index[category] = member_index[category[2]] = characters
+            group_members.setdefault(category[1], []).append(characters)
+
+        for tone_group, characters in group_members.items():
+            member_index[tone_group] = ''.join(dict.fromkeys(''.join(characters)))
+        return member_index
+
+    @_lazy
+    def counterparts(self):
+        """
+        Maps each category ID to a tuple of the IDs of the categories of the other tone that share characters with it.
+
+        The most shared characters come first, so the ping category 上平聲一東 leads to its counterparts 上聲一董 and
+        去聲一送, which share the characters read in either tone.
+        """
+        categories = self.categories
+        rhyme_masks = self.rhyme_masks
+        counterparts = []
+        for category_id, characters in enumerate(self.members):
+            tone = categories[category_id][0]
+            shared = {}
+            for char in dict.fromkeys(characters):
+                for other in _set_bits(rhyme_masks[char]):
+                    if categories[other][0] != tone:
+                        shared[other] = shared.get(other, 0) + 1
+            # The sort is stable, so categories sharing as many characters stay in category order
+            counterparts.append(tuple(sorted(sorted(shared), key=lambda other: -shared[other])))
+        return tuple(counterparts)
+
+    @_lazy
+    def rhyme_masks(self):
+        """
+        A dictionary where the keys are characters, and the values are bitmasks of their rhyme category IDs.
+
+        Two characters share a rhyme category exactly when their bitmasks have a bit in common.
+        """
+        if self.table is not None:
+            return _MappedIndex(self._read_rhyme_mask, 0)
+
+        bits = [1 << category_id for category_id in range(len(self.categories))]
+        rhyme_masks = _RhymeMasks()
+        for bit, characters in zip(bits, self.members):
+            for char in map(_share, characters):
+                rhyme_masks[char] = rhyme_masks[char] | bit
+        return rhyme_masks
+
+    def _read_rhyme_groups(self, char):
+        category_ids = self._read_category_ids(char)
+        return None if category_ids is None else tuple(self.categories[category_id] for category_id in category_ids)
+
+    def _read_rhyme_mask(self, char):
+        category_ids = self._read_category_ids(char)
+        if category_ids is None:
+            return None
+        mask = 0
+        for category_id in category_ids:
+            mask |= 1 << category_id
+        return mask
+
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULT_JSON_PATH = os.path.join(_DATA_DIR, 'organized_ping_ze_rhyme_dict.json')
+DEFAULT_COMPILED_PATH = os.path.join(_DATA_DIR, 'organized_ping_ze_rhyme_dict.bin')
+
+# Loaded rhyme data, keyed by absolute path of the data file
+_registry = {}
+_registry_lock = threading.Lock()
+
+# The data file of each rhyme book that can be loaded by name
+_books = {'pingshui': DEFAULT_COMPILED_PATH}
+
+
+def register_rhyme_book(name, path):
+    """
+    Registers the data file of a rhyme book under a name, so that it can be loaded by name wherever a data file
+    path or a book is accepted, e.g. PingZeClassifier('cilin') or classifier.classify(sentence, book='cilin').
+
+    The packaged Pingshui rhyme book is registered as 'pingshui'.
+    """
+    _books[name] = path
+
+
+def rhyme_books():
+    """Returns the names of the registered rhyme books."""
+    return sorted(_books)
+
+
+def _load(path):
+    if path.endswith('.bin'):
+        from .compiled import load_compiled, source_checksum
+        data = load_compiled(path)
+
+        # A table compiled from a JSON file that has since been edited would hide the edits
+        source = os.path.splitext(path)[0] + '.json'
+        if data.table.checksum and os.path.exists(source) and source_checksum(source) != data.table.checksum:
+            raise ValueError(f"{path} is out of date with {source}; recompile it with python -m pingshui_rhyme.compiled.")
+        return data
+    return RhymeData.from_json(path)
+
+
+def load_rhyme_data(json_file_path=None):
+    """
+    Returns the shared RhymeData for a data file or registered rhyme book name, loading it on first use.
+
+    Files ending in .bin are memory-mapped as compiled tables, anything else is parsed as JSON. A compiled
+    table with a JSON file of the same name next to it must have been compiled from that JSON as it is now.
+    Defaults to the compiled table in the package data folder, or the JSON next to it if the table
+    is missing, out of date or cannot be mapped on this platform.
+    """
+    if json_file_path is None:
+        json_file_path = DEFAULT_COMPILED_PATH
+    json_file_path = _books.get(json_file_path, json_file_path)
+    key = os.path.abspath(json_file_path)
+
+    data = _registry.get(key)
+    if data is None:
+        with _registry_lock:
+            data = _registry.get(key)
+            if data is None:
+                try:
+                    data = _load(key)
+                except (OSError, ValueError) as e:
+                    if key != DEFAULT_COMPILED_PATH:
+                        raise
+                    if isinstance(e, ValueError):
+                        warnings.warn(str(e), RuntimeWarning)
+                    # Fall back to parsing the packaged JSON
+                    data = _registry.get(DEFAULT_JSON_PATH) or RhymeData.from_json(DEFAULT_JSON_PATH)
+                    _registry[DEFAULT_JSON_PATH] = data
+                _registry[key] = data
+    return data
+
+
+def get_rhyme_book(book):
+    """Returns the RhymeData of a book given as a registered name, a data file path or a RhymeData."""
+    if isinstance(book, RhymeData):
+        return book
+    return load_rhyme_data(book)
+
+
+def clear_rhyme_data():
+    """Forgets all loaded rhyme data and the keys their indexes share, so that the next load_rhyme_data call re-reads its file."""
+    with _registry_lock:
+        _registry.clear()
+        _shared_keys.clear()
@@ -1,42 +1,90 @@
-import json
-import pkg_resources
+from .rhyme_data import load_rhyme_data, get_rhyme_book, _set_bits
+
+
+class RhymeRun:
+    """A run of lines rhyming in a common rhyme category, as found by RhymeChecker.rhyme_scheme."""
+    __slots__ = ('letter', 'lines', 'mask', 'categories')
+
+    def __init__(self, letter, lines, mask, categories):
+        # The scheme letter of the run, shared by runs that return to an earlier rhyme
+        self.letter = letter
+        # The 0-based indexes of the rhyming lines, as a tuple
+        self.lines = lines
+        # The bitmask of the rhyme categories shared by every line of the run, and their (tone_type, tone_group, rhyme_category) tuples
+        self.mask = mask
+        self.categories = categories
+
+    @property
+    def start(self):
+        return self.lines[0]
+
+    @property
+    def end(self):
+        return self.lines[-1]
+
+    def __repr__(self):
+        return f"RhymeRun({self.letter!r}, lines {self.start + 1}-{self.end + 1}, {'/'.join(c[2] for c in self.categories)})"
+
+
+class RhymeScheme:
+    """
+    The rhyme scheme of a poem, as found by RhymeChecker.rhyme_scheme.
+
+    scheme has one letter per line: the letter of the rhyme run the line belongs to, 'x' for a line that doesn't
+    rhyme, or '?' for a line whose last character is not in the rhyme data. runs holds the RhymeRun of each letter
+    occurrence in order, as a tuple, so a rhyme change (換韻) starts wherever a new run does.
+    """
+    __slots__ = ('scheme', 'runs')
+
+    def __init__(self, scheme, runs):
+        self.scheme = scheme
+        self.runs = runs
+
+    @property
+    def changes(self):
+        """The 0-based indexes of the lines where the rhyme changes."""
+        return [run.start for run in self.runs[1:]]
+
+    def __str__(self):
+        return self.scheme
+
+    def __repr__(self):
+        return f"RhymeScheme({self.scheme!r}, {self.runs!r})"
+
 
 class RhymeChecker:
     def __init__(self, json_file_path=None):
-        if json_file_path is None:
-            json_file_path = pkg_resources.resource_filename(
-                __name__, 'data/organized_ping_ze_rhyme_dict.json'
-            )
+        # Share the loaded rhyme dictionary with every other classifier and checker using the same file
+        self.data = load_rhyme_data(json_file_path)
 
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            self.ping_ze_dict = json.load(file)
+    def _data(self, book):
+        # The rhyme book of a call: the checker's own unless another is given
+        return self.data if book is None else get_rhyme_book(book)
 
-        self.rhyme_dict = self._build_rhyme_dict()
+    @property
+    def ping_ze_dict(self):
+        return self.data.view('ping_ze_dict')
 
-    def _build_rhyme_dict(self):
-        """
-        Builds a dictionary where the keys are characters, and the values are lists of their rhyme groups.
-        """
-        rhyme_dict = {}
-        for tone_type in self.ping_ze_dict:
-            for tone_group in self.ping_ze_dict[tone_type]:
-                for rhyme_category, characters in self.ping_ze_dict[tone_type][tone_group].items():
-                    for char_group in characters:
-                        for char in char_group:
-                            rhyme_group = (tone_type, tone_group, rhyme_category)
-                            if char in rhyme_dict:
-                                rhyme_dict[char].append(rhyme_group)
-                            else:
-                                rhyme_dict[char] = [rhyme_group]
-        return rhyme_dict
-    
-    def get_rhyme_group(self, char):
+    @property
+    def rhyme_dict(self):
+        """Maps each character to a tuple of its rhyme groups."""
+        return self.data.view('rhyme_dict')
+
+    @property
+    def rhyme_masks(self):
+        """Maps each character to a bitmask of its rhyme category IDs."""
+        return self.data.view('rhyme_masks')
+
+    def get_rhyme_group(self, char, book=None):
         """
-        Returns the list of rhyme groups for a given character, or None if the character is not found.
+        Returns the tuple of rhyme groups for a given character, or None if the character is not found.
+
+        Like every method taking book, it can look the character up in another rhyme book for this call only,
+        given as a registered name, a data file path or a RhymeData.
         """
-        return self.rhyme_dict.get(char)
+        return self._data(book).rhyme_dict.get(char)
 
-    def do_rhyme(self, char1, char2):
+    def do_rhyme(self, char1, char2, book=None):
         """
         Determines if two characters rhyme by comparing their rhyme groups and tone types.
 
@@ -44,20 +92,129 @@ class RhymeChecker:
 
         e.g. "鄉" is in 下平聲七陽 and 去聲二十三漾, it is assumed to use the rhyming pronunciation when compared to "昌" in 下平聲七陽
         """
-        rhyme_groups1 = self.get_rhyme_group(char1)
-        rhyme_groups2 = self.get_rhyme_group(char2)
-
-        if not rhyme_groups1 or not rhyme_groups2:
-            return False  # One or both characters are not in the rhyme data
-
-        # Check if there's any matching rhyme group between the two characters
-        for rhyme_group1 in rhyme_groups1:
-            for rhyme_group2 in rhyme_groups2:
-                if rhyme_group1 == rhyme_group2:
-                    return True
-        
-        return False
-    
+        rhyme_masks = self._data(book).rhyme_masks
+
+        # Each bit is one rhyme category, so the characters rhyme if their bitmasks share a bit.
+        # Characters that are not in the rhyme data have an empty bitmask and rhyme with nothing.
+        return bool(rhyme_masks[char1] & rhyme_masks[char2])
+
+    def rhyme_matrix(self, chars, book=None):
+        """
+        Determines which of the given characters rhyme with each other.
+
+        Returns a list of rows, where matrix[i][j] is True if chars[i] and chars[j] rhyme, as with do_rhyme.
+        """
+        rhyme_masks = self._data(book).rhyme_masks
+        masks = [rhyme_masks[char] for char in chars]
+        return [[bool(mask1 & mask2) for mask2 in masks] for mask1 in masks]
+
+    def characters_in_group(self, category, book=None):
+        """
+        Returns the characters of a rhyme category or tone group as a string, in dictionary order, or None if the category is not found.
+
+        category can be a category name such as '上平聲一東', a (tone_type, tone_group, rhyme_category) tuple as returned by
+        get_rhyme_group, an integer category ID, or a tone group name such as '上平聲部'. The string is shared, not copied.
+        """
+        return self._data(book).member_index.get(category)
+
+    def rhyming_candidates(self, char, tone=None, limit=None, book=None):
+        """
+        Yields the characters that rhyme with char, in dictionary order and without repeats.
+
+        For a character with several rhyme categories, the characters of each category are yielded in turn.
+        tone ('ping' or 'ze') restricts the candidates to categories of that tone, and limit caps how many are yielded.
+        """
+        if limit is not None and limit <= 0:
+            return
+
+        data = self._data(book)
+        categories = data.categories
+        member_index = data.member_index
+        mask = data.rhyme_masks[char]
+        seen = {char}
+
+        while mask:
+            # Take the category IDs in increasing order
+            bit = mask & -mask
+            mask ^= bit
+            category_id = bit.bit_length() - 1
+            if tone is not None and categories[category_id][0] != tone:
+                continue
+
+            for candidate in member_index[category_id]:
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                yield candidate
+                if limit is not None and len(seen) > limit:
+                    return
+
+    def rhyme_scheme(self, endings, book=None):
+        """
+        Finds the rhyme runs of a poem of any length, given the last character of each line, e.g. as a string.
+
+        Lines are read in one pass, keeping the rhyme categories the current run has in common. An even-numbered
+        line (2nd, 4th, ...) that doesn't share a category with the run starts a new run, together with the line
+        before it if those two rhyme, as when the first line of a new section rhymes. Odd-numbered lines that
+        don't rhyme with the run are not part of any run. A run that returns to the categories of an earlier run
+        gets its letter. Returns a RhymeScheme.
+
+        e.g. the endings of 靜夜思, "光霜月鄉", give the scheme "AAxA".
+        """
+        data = self._data(book)
+        rhyme_masks = data.rhyme_masks
+        categories = data.categories
+
+        # The run index of each line, or None
+        line_runs = []
+        runs = []  # [lines, mask] of each run
+        current = None
+        pending = None  # The index and bitmask of the last odd-numbered line left out of the current run
+
+        for i, char in enumerate(endings):
+            mask = rhyme_masks[char]
+            line_runs.append(None)
+            if not mask:
+                continue
+
+            if current is not None and current[1] & mask:
+                current[0].append(i)
+                current[1] &= mask
+                line_runs[i] = len(runs) - 1
+                pending = None
+            elif i % 2 == 0:
+                # An odd-numbered line may begin a new run with the next line
+                pending = (i, mask)
+            else:
+                if pending is not None and pending[1] & mask:
+                    current = [[pending[0], i], pending[1] & mask]
+                    line_runs[pending[0]] = len(runs)
+                else:
+                    current = [[i], mask]
+                line_runs[i] = len(runs)
+                runs.append(current)
+                pending = None
+
+        # Letter each run, reusing the letter of an earlier run with a category in common
+        letters_by_category = {}
+        rhyme_runs = []
+        next_letter = 0
+        for lines, mask in runs:
+            category_ids = list(_set_bits(mask))
+            letter = next((letters_by_category[c] for c in category_ids if c in letters_by_category), None)
+            if letter is None:
+                letter = chr(ord('A') + next_letter) if next_letter < 26 else f'[{next_letter + 1}]'
+                next_letter += 1
+            for category_id in category_ids:
+                letters_by_category.setdefault(category_id, letter)
+            rhyme_runs.append(RhymeRun(letter, tuple(lines), mask, tuple(categories[c] for c in category_ids)))
+
+        scheme = ''.join(
+            rhyme_runs[run].letter if run is not None else ('x' if char in rhyme_masks else '?')
+            for char, run in zip(endings, line_runs)
+        )
+        return RhymeScheme(scheme, tuple(rhyme_runs))
+
     def get_rhyme_type(self, char):
         """
         Returns the full list of rhyme types of the given character.
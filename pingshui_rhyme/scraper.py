@@ -1,34 +1,203 @@
+"""
+Scrapes the Pingshui rhyme dictionary from Wikisource and regenerates the packaged data.
+
+The pipeline has three stages that can also be run separately:
+
+- fetch_page downloads the page into an on-disk cache, revalidating it with ETag/If-Modified-Since headers
+- parse_page reads a saved page in a single streaming pass and returns the organized rhyme dictionary
+- emit_rhyme_data atomically writes the JSON and compiled table, only if the content changed
+
+    python -m pingshui_rhyme.scraper                       # fetch, parse and emit
+    python -m pingshui_rhyme.scraper --html saved.html     # parse a saved page without network access
+"""
+import argparse
+import hashlib
 import json
-from bs4 import BeautifulSoup
-import requests
 import os
+import sys
+import tempfile
+import time
+from html.parser import HTMLParser
+
+from pingshui_rhyme.compiled import compile_rhyme_data
+from pingshui_rhyme.rhyme_data import DEFAULT_JSON_PATH
+
+WIKISOURCE_URL = 'https://zh.wikisource.org/wiki/%E5%B9%B3%E6%B0%B4%E9%9F%BB'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pingshui_rhyme')
+
+# The prefixes of the rhyme section titles, e.g. 上平聲一東, and the tone group each belongs to
+SECTION_GROUPS = [
+    ('上平聲', 'ping', '上平聲部'),
+    ('下平聲', 'ping', '下平聲部'),
+    ('上聲', 'ze', '上聲部'),
+    ('去聲', 'ze', '去聲部'),
+    ('入聲', 'ze', '入聲部'),
+]
+
+
+def fetch_page(url=WIKISOURCE_URL, cache_dir=DEFAULT_CACHE_DIR, timeout=30, retries=3):
+    """
+    Downloads a page into cache_dir and returns the path of the saved HTML.
+
+    If the page was fetched before, the request is conditional on its ETag and Last-Modified headers, and the
+    cached copy is reused when the server answers 304 Not Modified. Failed requests are retried with backoff.
+    """
+    # Imported here so that the rest of the pipeline works without requests installed
+    import requests
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+    html_file = os.path.join(cache_dir, key + '.html')
+    meta_file = os.path.join(cache_dir, key + '.json')
+
+    headers = {}
+    if os.path.exists(html_file) and os.path.exists(meta_file):
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    for attempt in range(retries + 1):
+        try:
+            response = requests.get(url, headers=headers, timeout=timeout)
+            if response.status_code < 500:
+                break
+        except requests.RequestException:
+            if attempt == retries:
+                raise
+        if attempt < retries:
+            time.sleep(2 ** attempt)
+
+    if response.status_code == 304:
+        return html_file
+    response.raise_for_status()
+
+    _write_atomically(html_file, response.content)
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    _write_atomically(meta_file, json.dumps(meta, indent=4).encode('utf-8'))
+    return html_file
+
+
+class _ParagraphParser(HTMLParser):
+    """Collects the text of each <p> in the first div.mw-parser-output, like BeautifulSoup's get_text(strip=True)."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = []
+        self.done = False
+        self._depth = 0  # Nesting depth of divs within the content div
+        self._parts = None  # The stripped strings of the current paragraph
+        self._text = []  # The pieces of the current string, which may arrive in several chunks
+
+    def _end_string(self):
+        text = ''.join(self._text).strip()
+        self._text = []
+        if text and self._parts is not None:
+            self._parts.append(text)
+
+    def _end_paragraph(self):
+        self._end_string()
+        if self._parts is not None:
+            self.paragraphs.append(''.join(self._parts))
+            self._parts = None
+
+    def handle_starttag(self, tag, attrs):
+        self._end_string()
+        if tag == 'div':
+            if self._depth:
+                self._depth += 1
+            elif not self.done and 'mw-parser-output' in (dict(attrs).get('class') or '').split():
+                self._depth = 1
+        elif tag == 'p' and self._depth:
+            self._end_paragraph()
+            self._parts = []
+
+    def handle_endtag(self, tag):
+        self._end_string()
+        if tag == 'p':
+            self._end_paragraph()
+        elif tag == 'div' and self._depth:
+            self._depth -= 1
+            if not self._depth:
+                self._end_paragraph()
+                self.done = True
+
+    def handle_comment(self, data):
+        self._end_string()
+
+    def handle_data(self, data):
+        if self._parts is not None:
+            self._text.append(data)
+
+
+def _paragraphs_html_parser(html_file, chunk_size):
+    parser = _ParagraphParser()
+    with open(html_file, 'r', encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            parser.feed(chunk)
+            yield from parser.paragraphs
+            parser.paragraphs = []
+            if parser.done:
+                return
+    parser.close()
+    yield from parser.paragraphs
+
+
+def _paragraphs_lxml(html_file):
+    from lxml import etree
 
-def scrape_ping_ze_rhyme(force_refresh=False):
-    output_file = os.path.join(os.path.dirname(__file__), 'data', 'organized_ping_ze_rhyme_dict.json')
+    content = None
+    for event, element in etree.iterparse(html_file, events=('start', 'end'), html=True, encoding='utf-8'):
+        if event == 'start':
+            if content is None and element.tag == 'div' and 'mw-parser-output' in (element.get('class') or '').split():
+                content = element
+        elif content is not None:
+            if element.tag == 'p':
+                yield ''.join(text.strip() for text in element.itertext(tag=etree.Element) if text.strip())
+                element.clear()
+            elif element is content:
+                return
 
-    # Check if the file exists and if force_refresh is False
-    if os.path.exists(output_file) and not force_refresh:
-        print(f"JSON file already exists at {output_file}. Use `force_refresh=True` to regenerate.")
-        return
-    
-    # Load the page
-    url = 'https://zh.wikisource.org/wiki/%E5%B9%B3%E6%B0%B4%E9%9F%BB'
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
 
+def parse_page(html_file, parser='auto', chunk_size=65536):
+    """
+    Parses a saved Wikisource page into the organized ping-ze rhyme dictionary.
+
+    The page is read in a single streaming pass. parser is 'lxml', 'html.parser' (the standard library parser,
+    reading chunk_size characters at a time) or 'auto', which uses lxml if it is installed.
+    """
+    if parser == 'auto':
+        try:
+            import lxml  # noqa: F401
+            parser = 'lxml'
+        except ImportError:
+            parser = 'html.parser'
+
+    if parser == 'lxml':
+        paragraphs = _paragraphs_lxml(html_file)
+    elif parser == 'html.parser':
+        paragraphs = _paragraphs_html_parser(html_file, chunk_size)
+    else:
+        raise ValueError(f"Unknown parser {parser!r}; expected 'lxml', 'html.parser' or 'auto'.")
+
+    return organize_rhyme_sections(paragraphs)
+
+
+def organize_rhyme_sections(paragraphs):
+    """Groups the text of the page's paragraphs into the ping and ze rhyme sections of the JSON layout."""
     # Initialize an empty hash map (dictionary)
     rhyme_dict = {}
     current_section_title = None
 
-    # Locate the main content where rhyme data is present
-    content = soup.find('div', class_='mw-parser-output')
-
-    # Iterate through all <p> tags that contain the rhyme data
-    for paragraph in content.find_all('p'):
-        text = paragraph.get_text(strip=True)
-
+    for text in paragraphs:
         # Check if the paragraph contains a rhyme section title (e.g., 上平聲一東)
-        if text.startswith('上平聲') or text.startswith('下平聲') or text.startswith('上聲') or text.startswith('去聲') or text.startswith('入聲'):
+        if text.startswith(tuple(prefix for prefix, _, _ in SECTION_GROUPS)):
             current_section_title = text.strip()
             rhyme_dict[current_section_title] = []  # Initialize an empty list for this section
         elif current_section_title:
@@ -36,49 +205,94 @@ def scrape_ping_ze_rhyme(force_refresh=False):
                 text = text.replace('【詞】', '').replace('【辭】', '').strip()
             words = text.split()
             rhyme_dict[current_section_title].extend(words)
-        elif text.startswith('【詞】') or text.startswith('【辭】'):
-            text = text.replace('【詞】', '').replace('【辭】', '').strip()
-            words = text.split()
-            rhyme_dict[current_section_title].extend(words)
 
-    def collapse_strings_in_dict(d):
-        for key, value in d.items():
-            if isinstance(value, list):
-                d[key] = [''.join(value)  ]
-            elif isinstance(value, dict):
-                collapse_strings_in_dict(value) 
-    collapse_strings_in_dict(rhyme_dict)
-
-    organized_rhyme_dict = {
-        "ping": {
-            "上平聲部": {},
-            "下平聲部": {}
-        },
-        "ze": {
-            "上聲部": {},
-            "去聲部": {},
-            "入聲部": {}
-        }
-    }
+    organized_rhyme_dict = {}
+    for _, tone_type, tone_group in SECTION_GROUPS:
+        organized_rhyme_dict.setdefault(tone_type, {})[tone_group] = {}
 
-    # Organize into ping and ze categories based on section names
+    # Organize into ping and ze categories based on section names, collapsing each section's words into a string
     for section, words in rhyme_dict.items():
-        if section.startswith("上平聲"):
-            organized_rhyme_dict["ping"]["上平聲部"][section] = words
-        elif section.startswith("下平聲"):
-            organized_rhyme_dict["ping"]["下平聲部"][section] = words
-        elif section.startswith("上聲"):
-            organized_rhyme_dict["ze"]["上聲部"][section] = words
-        elif section.startswith("去聲"):
-            organized_rhyme_dict["ze"]["去聲部"][section] = words
-        elif section.startswith("入聲"):
-            organized_rhyme_dict["ze"]["入聲部"][section] = words
-
-    # Save the result as a JSON structure
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(organized_rhyme_dict, f, ensure_ascii=False, indent=4)
-
-    print(f"Rhyme dictionary successfully scraped and saved to {output_file}.")
+        for prefix, tone_type, tone_group in SECTION_GROUPS:
+            if section.startswith(prefix):
+                organized_rhyme_dict[tone_type][tone_group][section] = [''.join(words)]
+                break
+
+    return organized_rhyme_dict
+
+
+def _write_atomically(path, content):
+    # Write a temporary file in the same directory, then rename it over the target
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def emit_rhyme_data(rhyme_dict, output_file=DEFAULT_JSON_PATH, compiled_file=None, force=False):
+    """
+    Writes the rhyme dictionary as JSON and compiles its binary table, returning whether anything was written.
+
+    Each file is replaced atomically, so readers never see a partial file. If the JSON content hash is the
+    same as that of the existing file, neither file is rewritten, unless the compiled table is missing or
+    force is set.
+    """
+    if compiled_file is None:
+        compiled_file = os.path.splitext(output_file)[0] + '.bin'
+
+    content = json.dumps(rhyme_dict, ensure_ascii=False, indent=4).encode('utf-8')
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    if os.path.exists(output_file) and not force:
+        with open(output_file, 'rb') as f:
+            unchanged = hashlib.sha256(f.read()).digest() == hashlib.sha256(content).digest()
+        if unchanged and os.path.exists(compiled_file):
+            return False
+
+    _write_atomically(output_file, content)
+
+    # Compile next to the target, then move it into place
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(compiled_file)), suffix='.tmp')
+    os.close(fd)
+    try:
+        compile_rhyme_data(output_file, temporary_path)
+        os.replace(temporary_path, compiled_file)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+    return True
+
+
+def scrape_ping_ze_rhyme(force_refresh=False, html_file=None, output_file=DEFAULT_JSON_PATH,
+                         url=WIKISOURCE_URL, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Regenerates the JSON and compiled rhyme dictionary from Wikisource, or from a saved page if html_file is given.
+
+    The files are only rewritten if the scraped content differs from the existing JSON, unless force_refresh is set.
+    """
+    if html_file is None:
+        html_file = fetch_page(url, cache_dir)
+
+    if emit_rhyme_data(parse_page(html_file), output_file, force=force_refresh):
+        print(f"Rhyme dictionary successfully scraped and saved to {output_file}.")
+    else:
+        print(f"Rhyme dictionary at {output_file} is already up to date.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--html', metavar='FILE', help='parse a saved page instead of fetching it')
+    parser.add_argument('--output', metavar='FILE', default=DEFAULT_JSON_PATH, help='JSON file to write; the compiled table is written next to it')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f'HTTP cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--force', action='store_true', help='rewrite the data files even if their content is unchanged')
+    args = parser.parse_args(argv)
+
+    scrape_ping_ze_rhyme(args.force, args.html, args.output, cache_dir=args.cache_dir)
+    return 0
+
 
 if __name__ == "__main__":
-    scrape_ping_ze_rhyme()
+    sys.exit(main())
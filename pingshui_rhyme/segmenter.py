@@ -0,0 +1,180 @@
+"""
+Streaming segmentation of text into poems.
+
+Text is read in chunks and split into lines at punctuation and line breaks. Runs of lines of the same length
+(5 or 7 characters by default) form a poem, which ends at a blank line, at a line of another length, or at
+text that is not verse, such as titles, prose or Latin script. Only the current poem and the unfinished end of
+the last chunk are kept in memory.
+"""
+import re
+from functools import partial
+
+# The punctuation that ends a line of verse
+PUNCTUATION = '，。！？；：、'
+
+# Splits text into runs of line characters, whitespace and punctuation
+_TOKENS = re.compile(r'([^\s，。！？；：、]+)|(\s+)|([，。！？；：、]+)')
+
+# Runs of CJK ideographs, the only characters a line of verse is made of
+_HAN = re.compile('[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0002fa1f]+\\Z')
+
+
+class PoemSegmenter:
+    """
+    Splits a stream of text into poems, yielding each poem as a list of lines.
+
+    Feed chunks of text in order with feed(), then call close() at the end of the input; both are generators
+    of the poems completed so far. A run of characters between separators is a line if it has one of
+    line_lengths characters, and is split into lines by length if it holds 2, or any of line_counts, lines
+    without punctuation between them. A run of lines is yielded as a poem if it has one of line_counts lines.
+    Runs of fewer lines than the smallest line count with no punctuation directly before or after them, at
+    either end of a poem with punctuated lines, are titles or attributions and are left out. In a poem without
+    punctuation, one extra line is taken for a title and dropped. Runs holding a multiple of the line counts,
+    like poems not separated by blank lines, are split into poems of the largest line count that divides them;
+    other runs are skipped. At most max_lines lines are buffered before a poem is forced to end.
+    """
+
+    def __init__(self, line_lengths=(5, 7), line_counts=(4, 8), max_lines=64):
+        self.line_lengths = tuple(line_lengths)
+        self.line_counts = tuple(sorted(line_counts, reverse=True))
+        self.max_lines = max(max_lines, self.line_counts[0])
+
+        # Longer runs of characters without a separator are never verse
+        self._max_run = max(self.line_lengths) * self.line_counts[0]
+        self._pending = ''
+        self._skipping = False
+
+        # The runs of the current poem as [lines, punctuated] pairs, where punctuated is set if punctuation comes
+        # directly before or after the run, and the number of lines they hold
+        self._runs = []
+        self._line_count = 0
+        # The run the last token belongs to, while it can still be followed by punctuation, and whether the last
+        # token was punctuation
+        self._last_run = None
+        self._after_punctuation = False
+
+    def feed(self, text):
+        """Segments the next chunk of text, yielding the poems it completes."""
+        yield from self._consume(text, False)
+
+    def close(self):
+        """Segments the rest of the input, yielding its remaining poems."""
+        yield from self._consume('', True)
+        yield from self._end_poem()
+
+    def _consume(self, text, final):
+        text, self._pending = self._pending + text, ''
+        for match in _TOKENS.finditer(text):
+            run, space, punctuation = match.groups()
+
+            # A run of characters or whitespace at the end of the chunk may continue in the next one
+            if match.end() == len(text) and not final and (run or space):
+                if run and (self._skipping or len(run) > self._max_run):
+                    # Too long to be verse, so its continuation is skipped rather than buffered
+                    if not self._skipping:
+                        yield from self._end_poem()
+                        self._skipping = True
+                else:
+                    self._pending = match.group()
+                return
+
+            if run:
+                if self._skipping:
+                    self._skipping = False
+                else:
+                    yield from self._add_run(run, self._after_punctuation)
+                self._after_punctuation = False
+            else:
+                self._skipping = False
+                if punctuation and self._last_run is not None:
+                    self._last_run[1] = True
+                self._last_run = None
+                self._after_punctuation = bool(punctuation)
+                if space and space.count('\n') >= 2:
+                    # A blank line
+                    yield from self._end_poem()
+
+    def split_run(self, run):
+        """Returns the lines of a run of characters between separators, or None if it is not verse."""
+        if not _HAN.match(run):
+            return None
+        for line_length in self.line_lengths:
+            count, remainder = divmod(len(run), line_length)
+            if not remainder and (count in (1, 2) or count in self.line_counts):
+                return [run[i:i + line_length] for i in range(0, len(run), line_length)]
+        return None
+
+    def _add_run(self, run, punctuated):
+        lines = self.split_run(run)
+        if lines is None:
+            yield from self._end_poem()
+            return
+
+        current = None
+        for line in lines:
+            if self._runs and len(line) != len(self._runs[0][0][0]):
+                yield from self._end_poem()
+            if not self._runs:
+                current = None
+            if current is None:
+                current = [[], punctuated]
+                self._runs.append(current)
+            current[0].append(line)
+            self._line_count += 1
+            if self._line_count >= self.max_lines:
+                yield from self._end_poem()
+                current = None
+        self._last_run = current
+
+    def _end_poem(self):
+        runs, self._runs = self._runs, []
+        self._line_count = 0
+        self._last_run = None
+
+        punctuated = any(run_punctuated for _, run_punctuated in runs)
+        if punctuated:
+            # Short runs without punctuation at either end of punctuated verse are titles or attributions
+            shortest = self.line_counts[-1]
+            while runs and not runs[0][1] and len(runs[0][0]) < shortest:
+                del runs[0]
+            while runs and not runs[-1][1] and len(runs[-1][0]) < shortest:
+                del runs[-1]
+
+        lines = [line for run_lines, _ in runs for line in run_lines]
+        count = len(lines)
+        if not count:
+            return
+
+        if count in self.line_counts:
+            yield lines
+        elif count - 1 in self.line_counts:
+            # Without punctuation to tell verse from a title, the first line is taken for one. Otherwise both ends
+            # are verse and the extra line can't be told apart, so the run is skipped rather than guessed at.
+            if not punctuated:
+                yield lines[1:]
+        else:
+            for line_count in self.line_counts:
+                if count % line_count == 0:
+                    for i in range(0, count, line_count):
+                        yield lines[i:i + line_count]
+                    return
+
+
+def segment_poems(source, chunk_size=65536, **options):
+    """
+    Yields the lines of each poem found in source, lazily and in a single pass.
+
+    source is a string, a text file object, which is read chunk_size characters at a time, or an iterable of
+    strings such as the lines of a file. options are passed to PoemSegmenter.
+    """
+    segmenter = PoemSegmenter(**options)
+    if isinstance(source, str):
+        chunks = [source]
+    elif hasattr(source, 'read'):
+        chunks = iter(partial(source.read, chunk_size), '')
+    else:
+        chunks = source
+
+    for chunk in chunks:
+        yield from segmenter.feed(chunk)
+    yield from segmenter.close()
@@ -0,0 +1,162 @@
+from .classifier import PING, ZE
+from .meter import tone_bits
+from .rhyme_data import _FIRST_MATCH_CODES
+from .poem_structure_checker import PoemStructureChecker
+
+
+class PoemSession:
+    """
+    A poem being edited line by line, whose rhyming and ping-ze meter are rechecked incrementally.
+
+    Each line is classified once when it is set, keeping its tone codes and the tone and rhyme categories of its
+    last character. A check then only re-evaluates what the edits since the last check could have changed:
+    the rhyming rules are rerun on the cached line endings only if an ending changed, and only the alternation
+    pairs containing an edited line are compared again.
+
+    The results are the same as the checker's check_poem_rhyming and check_poem_pingze_meter give for a poem of
+    these lines, e.g. the lines joined by '，'. Lines are cleaned of punctuation like clean_poem does, and text that
+    clean_poem would split into several lines, such as '白日依山盡黃河入海流', is rejected with ValueError.
+    """
+
+    def __init__(self, checker=None, poem=None):
+        self.checker = checker if checker is not None else PoemStructureChecker()
+        self.lines = []
+
+        # Per line: the meter tone codes, their ping and ze tone_bits, and the (tone, rhyme mask) of the last character
+        self._codes = []
+        self._ping_bits = []
+        self._ze_bits = []
+        self._endings = []
+
+        # The alternation mismatch position of each pair of lines, keyed by the index of its first line,
+        # for the line length they were computed with
+        self._pairs = {}
+        self._pairs_length = None
+
+        # The latest results, or None after an edit that may change them
+        self._rhyming = None
+        self._meter = None
+
+        if poem is not None:
+            self.set_poem(poem)
+
+    def _analyze(self, text):
+        lines = self.checker.clean_poem(text)
+        if not lines:
+            raise ValueError("A line must have at least one character; use delete_line to remove a line.")
+        if len(lines) > 1:
+            # The line would be split when the poem is checked as a whole, so the results would differ
+            raise ValueError(f"{text!r} is {len(lines)} lines, not one; set or insert each line separately.")
+        line = lines[0]
+
+        codes = self.checker.classifier.classify_codes(line, self.checker.polyphonic)
+        # The rhyming rules read a character of both tones as ping, whether or not the meter check is polyphonic
+        ending = (_FIRST_MATCH_CODES[codes[-1]], self.checker.rhyme_checker.rhyme_masks.get(line[-1], 0))
+        return line, codes, tone_bits(codes, PING), tone_bits(codes, ZE), ending
+
+    def _store(self, index, analysis, insert=False):
+        line, codes, ping_bits, ze_bits, ending = analysis
+        for values, value in ((self.lines, line), (self._codes, codes), (self._ping_bits, ping_bits),
+                              (self._ze_bits, ze_bits), (self._endings, ending)):
+            if insert:
+                values.insert(index, value)
+            else:
+                values[index] = value
+
+    def set_poem(self, poem):
+        """Replaces the whole poem, splitting it into lines like clean_poem."""
+        lines = self.checker.clean_poem(poem)
+        analyses = [self._analyze(line) for line in lines]
+        self.lines, self._codes, self._ping_bits, self._ze_bits, self._endings = [], [], [], [], []
+        for i, analysis in enumerate(analyses):
+            self._store(i, analysis, insert=True)
+        self._pairs.clear()
+        self._rhyming = self._meter = None
+
+    def set_line(self, index, text):
+        """Replaces the line at index. Only the rules involving that line are checked again."""
+        analysis = self._analyze(text)
+        index = range(len(self.lines))[index]  # Accept negative indexes and raise IndexError like a list
+
+        # The rhyming depends on the line endings and on the length of the first line
+        if analysis[4] != self._endings[index] or (index == 0 and len(analysis[0]) != len(self.lines[0])):
+            self._rhyming = None
+
+        self._store(index, analysis)
+        self._pairs.pop(index - index % 2, None)
+        self._meter = None
+
+    def insert_line(self, index, text):
+        """Inserts a line before index, like list.insert."""
+        analysis = self._analyze(text)
+        index = max(0, min(len(self.lines), index if index >= 0 else len(self.lines) + index))
+        self._store(index, analysis, insert=True)
+        self._lines_moved(index)
+
+    def delete_line(self, index):
+        """Removes the line at index."""
+        index = range(len(self.lines))[index]
+        for values in (self.lines, self._codes, self._ping_bits, self._ze_bits, self._endings):
+            del values[index]
+        self._lines_moved(index)
+
+    def _lines_moved(self, index):
+        # Every pair from the one containing index onward now holds different lines
+        start = index - index % 2
+        for i in [i for i in self._pairs if i >= start]:
+            del self._pairs[i]
+        self._rhyming = self._meter = None
+
+    def check_poem_rhyming(self):
+        if self._rhyming is None:
+            checker = self.checker
+            self._rhyming = checker._rhyming_shape_error(self.lines)
+            if self._rhyming is None:
+                self._rhyming = checker._check_rhyming_endings(
+                    bytes(tone for tone, _ in self._endings),
+                    [mask for _, mask in self._endings],
+                )
+        return self._rhyming
+
+    def check_poem_pingze_meter(self):
+        if self._meter is None:
+            self._meter = self._check_meter()
+        return self._meter
+
+    def check_poem(self):
+        """Returns the (rhyming, meter) pair of results, like PoemStructureChecker.check_poem."""
+        return self.check_poem_rhyming(), self.check_poem_pingze_meter()
+
+    def _check_meter(self):
+        if not self.lines:
+            return False, "Poem has no lines."
+
+        # Lines of other lengths, such as a line still being typed, fail like in the full check
+        length_error = self.checker._line_length_error(self.lines)
+        if length_error is not None:
+            return length_error
+        characters_per_line = len(self.lines[0])
+
+        # Combine the lines' tone bits into those of the whole poem, the first line being the lowest bits
+        meter = self.checker.meter
+        ping = ze = 0
+        for i in range(len(self.lines) - 1, -1, -1):
+            ping = ping << characters_per_line | self._ping_bits[i]
+            ze = ze << characters_per_line | self._ze_bits[i]
+        pattern_type = meter.match_scheme_bits(ping, ze, len(self.lines), characters_per_line)
+
+        mismatch = None
+        if pattern_type is None:
+            if characters_per_line != self._pairs_length:
+                self._pairs.clear()
+                self._pairs_length = characters_per_line
+
+            for i in range(0, len(self.lines) - 1, 2):
+                if i not in self._pairs:
+                    pair_mismatch = meter.alternation_mismatch(self._codes[i:i + 2], characters_per_line)
+                    self._pairs[i] = None if pair_mismatch is None else pair_mismatch[1]
+                if self._pairs[i] is not None:
+                    mismatch = i, self._pairs[i]
+                    break
+
+        return self.checker._meter_verdict(pattern_type, mismatch)
@@ -20,11 +20,17 @@ setuptools.setup(
         'Operating System :: OS Independent',
     ],
     python_requires='>=3.6',
-    install_requires=[
-        'beautifulsoup4',
-        'requests',
-    ],
+    extras_require={
+        'scraper': ['requests'],
+        'numpy': ['numpy'],
+        'lxml': ['lxml'],
+    },
     package_data={
-        'pingshui_rhyme': ['data/*.json'],
+        'pingshui_rhyme': ['data/*.json', 'data/*.bin'],
+    },
+    entry_points={
+        'console_scripts': [
+            'pingshui-rhyme=pingshui_rhyme.cli:main',
+        ],
     },
 )
@@ -0,0 +1,54 @@
+import unittest
+from pingshui_rhyme import PoemStructureChecker
+from pingshui_rhyme.analytics import CorpusAnalyzer, numpy
+
+POEMS = [
+    '床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。',
+    '白日依山盡，黃河入海流。欲窮千里目，更上一層樓。',
+    '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。',
+    '朝辭白帝彩雲間，千里江陵一日還。兩岸猿聲啼不住，輕舟已過萬重山。',
+    '春眠不覺曉',
+    '一二三',
+]
+
+class TestCorpusAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.checker = PoemStructureChecker()
+
+    def test_python_backend(self):
+        stats = CorpusAnalyzer(self.checker, 'python').analyze(POEMS)
+        self.assertEqual(stats['poems'], 6)
+        self.assertEqual(stats['skipped'], 1)
+
+        five = stats['lengths'][5]
+        self.assertEqual(five['poems'], 4)
+        self.assertEqual(five['lines'], 13)
+        self.assertEqual(sum(map(sum, five['histogram'])), 65)
+        self.assertEqual(five['alternation_pairs'], 6)
+        # Only the 2nd and 4th characters are compared in 5-character poems
+        self.assertEqual(five['alternation_violations'][0], 0)
+
+        # Each poem counts for the first scheme it follows, like check_poem_pingze_meter
+        expected = dict.fromkeys(five['matches'], 0)
+        for poem in POEMS[:3] + POEMS[4:5]:
+            lines = self.checker.clean_poem(poem)
+            expected[self.checker.meter.match_scheme(self.checker._classify_lines(lines), 5) or 'unmatched'] += 1
+        self.assertEqual(five['matches'], expected)
+        self.assertEqual(stats['lengths'][7]['matches']['unmatched'], 1)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_backend(self):
+        analyzer = CorpusAnalyzer(self.checker, 'numpy', batch_size=2)
+        self.assertEqual(analyzer.tone_codes(['東董?']).tolist(), list(self.checker.classifier.classify_codes('東董?')))
+        for polyphonic in (False, True):
+            self.assertEqual(
+                analyzer.analyze(POEMS * 3, polyphonic),
+                CorpusAnalyzer(self.checker, 'python').analyze(POEMS * 3, polyphonic),
+            )
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            CorpusAnalyzer(self.checker, 'cuda')
+
+if __name__ == '__main__':
+    unittest.main()
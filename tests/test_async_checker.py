@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pingshui_rhyme import PingZeClassifier, PoemStructureChecker
+from pingshui_rhyme.async_checker import AsyncChecker
+
+POEMS = [
+    '床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。',
+    '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。',
+    '白日依山盡，黃河入海流。欲窮千里目，更上一層樓。',
+]
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(2)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+class TestAsyncChecker(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.expected = [PoemStructureChecker().check_poem(poem) for poem in POEMS * 10]
+
+    def tearDown(self):
+        self.loop.close()
+
+    async def collect(self, results):
+        return [result async for result in results]
+
+    def test_acheck_poem_batches(self):
+        with CountingExecutor() as executor:
+            checker = AsyncChecker(executor=executor, max_batch=8, max_pending=16)
+
+            async def check_all():
+                return await asyncio.gather(*[checker.acheck_poem(poem) for poem in POEMS * 10])
+
+            results = self.loop.run_until_complete(check_all())
+        self.assertEqual(results, self.expected)
+        # 30 concurrent poems in batches of at most 8
+        self.assertEqual(executor.submitted, 4)
+
+    def test_acheck_poem_successive_loops(self):
+        # The checker outlives the loop it was first used in, as with successive asyncio.run calls
+        checker = AsyncChecker(max_batch=2, max_pending=1)
+
+        async def check_all():
+            return await asyncio.gather(*[checker.acheck_poem(poem) for poem in POEMS])
+
+        self.assertEqual(self.loop.run_until_complete(check_all()), self.expected[:3])
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(check_all()), self.expected[:3])
+        finally:
+            loop.close()
+
+    def test_acheck_corpus(self):
+        checker = AsyncChecker(max_chunks=2)
+        results = self.loop.run_until_complete(self.collect(checker.acheck_corpus(iter(POEMS * 10), chunksize=4)))
+        self.assertEqual(results, self.expected)
+
+    def test_acheck_corpus_async_iterable(self):
+        async def poems():
+            for poem in POEMS * 10:
+                yield poem
+
+        with ProcessPoolExecutor(2) as executor:
+            checker = AsyncChecker(executor=executor)
+            results = self.loop.run_until_complete(self.collect(checker.acheck_corpus(poems(), chunksize=7)))
+        self.assertEqual(results, self.expected)
+
+    def test_aclassify_batch(self):
+        sentences = ['床前明月光', '疑是地上霜', '鄉']
+        checker = AsyncChecker()
+        results = self.loop.run_until_complete(self.collect(checker.aclassify_batch(sentences, polyphonic=True, chunksize=2)))
+        self.assertEqual(results, list(PingZeClassifier().classify_batch(sentences, polyphonic=True)))
+
+if __name__ == '__main__':
+    unittest.main()
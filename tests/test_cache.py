@@ -0,0 +1,58 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pingshui_rhyme import PoemStructureChecker
+from pingshui_rhyme.cache import VerdictCache
+
+class TestVerdictCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = VerdictCache(2)
+        cache.get_or_compute('a', lambda: 1)
+        cache.get_or_compute('b', lambda: 2)
+        cache.get_or_compute('a', lambda: 0)  # Hit, so 'b' becomes the least recently used
+        cache.get_or_compute('c', lambda: 3)
+        self.assertEqual(cache.get_or_compute('a', lambda: 0), 1)
+        self.assertEqual(cache.get_or_compute('b', lambda: 4), 4)
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 4, 'evictions': 2, 'size': 2, 'maxsize': 2})
+
+    def test_fifo_eviction(self):
+        cache = VerdictCache(2, 'fifo')
+        cache.get_or_compute('a', lambda: 1)
+        cache.get_or_compute('b', lambda: 2)
+        cache.get_or_compute('a', lambda: 0)
+        cache.get_or_compute('c', lambda: 3)
+        self.assertEqual(cache.get_or_compute('a', lambda: 5), 5)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            VerdictCache(0)
+        with self.assertRaises(ValueError):
+            VerdictCache(10, 'random')
+
+    def test_checker_cache(self):
+        checker = PoemStructureChecker(cache_size=16)
+        poem = '床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。'
+        expected = PoemStructureChecker().check_poem(poem)
+        self.assertEqual(checker.check_poem(poem), expected)
+        # Differently punctuated copies of the poem share the cached results
+        self.assertEqual(checker.check_poem(poem.replace('，', '\n')), expected)
+        self.assertEqual(checker.cache_stats()['hits'], 2)
+        self.assertEqual(checker.cache_stats()['misses'], 2)
+        self.assertIsNone(PoemStructureChecker().cache_stats())
+
+    def test_shared_between_threads(self):
+        checker = PoemStructureChecker(cache_size=4)
+        poems = [
+            '床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。',
+            '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。',
+            '白日依山盡，黃河入海流。欲窮千里目，更上一層樓。',
+        ] * 200
+        expected = [PoemStructureChecker().check_poem(poem) for poem in poems]
+        with ThreadPoolExecutor(8) as executor:
+            self.assertEqual(list(executor.map(checker.check_poem, poems)), expected)
+        stats = checker.cache_stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 2 * len(poems))
+        self.assertEqual(stats['size'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
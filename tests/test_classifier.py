@@ -1,5 +1,6 @@
 import unittest
 from pingshui_rhyme import PingZeClassifier
+from pingshui_rhyme.classifier import UNKNOWN, PING, ZE, BOTH
 
 class TestPingZeClassifier(unittest.TestCase):
 
@@ -12,5 +13,22 @@ class TestPingZeClassifier(unittest.TestCase):
         expected = ['ping', 'ze', 'unknown', 'ping', 'ze', 'unknown', 'ping', 'ze', 'ze', 'ping', 'ping', 'ze', 'unknown']
         self.assertEqual(result, expected)
 
+    def test_classify_codes(self):
+        result = self.classifier.classify_codes("知否？")
+        self.assertEqual(result, bytes([PING, ZE, UNKNOWN]))
+
+    def test_classify_polyphonic(self):
+        self.assertEqual(self.classifier.classify("看東"), ['ping', 'ping'])
+        self.assertEqual(self.classifier.classify("看東", polyphonic=True), ['both', 'ping'])
+        self.assertEqual(self.classifier.classify_codes("看東董", polyphonic=True), bytes([BOTH, PING, ZE]))
+        self.assertIn("看", self.classifier.polyphones)
+        self.assertNotIn("東", self.classifier.polyphones)
+
+    def test_classify_batch(self):
+        sentences = ["床前明月光", "疑是地上霜"]
+        result = list(self.classifier.classify_batch(sentences))
+        expected = [self.classifier.classify(sentence) for sentence in sentences]
+        self.assertEqual(result, expected)
+
 if __name__ == '__main__':
     unittest.main()
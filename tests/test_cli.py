@@ -0,0 +1,69 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from pingshui_rhyme.cli import main
+
+POEMS = '床前明月光，\n疑是地上霜。\n舉頭望明月，\n低頭思故鄉。\n\n紅豆生南國，春來發幾枝。願君多采擷，此物最相思。\n'
+
+class TestCli(unittest.TestCase):
+
+    def run_cli(self, argv, stdin=''):
+        stdout = io.StringIO()
+        self.assertEqual(main(argv, io.StringIO(stdin), stdout), 0)
+        return stdout.getvalue().splitlines()
+
+    def test_classify(self):
+        output = self.run_cli(['classify'], '知否\n')
+        self.assertEqual(json.loads(output[0]), {'text': '知否', 'tones': ['ping', 'ze']})
+
+    def test_classify_tsv(self):
+        output = self.run_cli(['classify', '--format', 'tsv'], '知否\n')
+        self.assertEqual(output, ['知否\tping ze'])
+
+    def test_rhyme(self):
+        output = self.run_cli(['rhyme'], '東同\n東董\n')
+        self.assertTrue(json.loads(output[0])['rhymes'])
+        self.assertFalse(json.loads(output[1])['rhymes'])
+
+    def test_check(self):
+        output = [json.loads(line) for line in self.run_cli(['check'], POEMS)]
+        self.assertEqual(len(output), 2)
+        self.assertEqual(output[0]['poem'], '床前明月光，\n疑是地上霜。\n舉頭望明月，\n低頭思故鄉。')
+        self.assertEqual(output[0]['rhyming_message'], "Poem follows jueju rhyming rules.")
+
+    def test_check_punctuation_only(self):
+        # A poem of nothing but punctuation is reported as invalid and the following poems are still checked
+        output = [json.loads(line) for line in self.run_cli(['check'], '床前明月光，疑是地上霜。\n\n。。\n\n' + POEMS)]
+        self.assertEqual([record['poem'] for record in output][:2], ['床前明月光，疑是地上霜。', '。。'])
+        self.assertEqual(len(output), 4)
+        self.assertFalse(output[1]['meter'])
+        self.assertEqual(output[1]['meter_message'], "Poem has no lines.")
+
+    def test_check_short_line(self):
+        output = [json.loads(line) for line in self.run_cli(['check', '--per-line'], '床前明月光，疑是。\n' + POEMS)]
+        self.assertEqual(output[0]['meter_message'], "Each line must have 5 characters like the first line.")
+        # Every line of the input after it is still checked
+        self.assertEqual(len(output), 6)
+
+    def test_check_segment(self):
+        text = '靜夜思\n李白\n' + POEMS.replace('\n\n', '\nThe next poem:\n')
+        output = [json.loads(line) for line in self.run_cli(['check', '--segment'], text)]
+        self.assertEqual([record['poem'] for record in output], [
+            '床前明月光\n疑是地上霜\n舉頭望明月\n低頭思故鄉',
+            '紅豆生南國\n春來發幾枝\n願君多采擷\n此物最相思',
+        ])
+
+    def test_check_file_with_jobs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'poems.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write((POEMS + '\n') * 3)
+            serial = self.run_cli(['check', path])
+            parallel = self.run_cli(['check', '--jobs', '2', '--chunksize', '1', path])
+        self.assertEqual(len(serial), 6)
+        self.assertEqual(serial, parallel)
+
+if __name__ == '__main__':
+    unittest.main()
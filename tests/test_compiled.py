@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from pingshui_rhyme import PingZeClassifier
+from pingshui_rhyme.compiled import compile_rhyme_data, load_compiled
+from pingshui_rhyme.rhyme_data import RhymeData, DEFAULT_JSON_PATH, DEFAULT_COMPILED_PATH, clear_rhyme_data, load_rhyme_data
+
+class TestCompiled(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = compile_rhyme_data(DEFAULT_JSON_PATH, os.path.join(cls.tmpdir.name, 'rhymes.bin'))
+        cls.json_data = RhymeData.from_json(DEFAULT_JSON_PATH)
+        cls.compiled_data = load_compiled(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.compiled_data
+        clear_rhyme_data()
+        cls.tmpdir.cleanup()
+
+    def test_same_categories(self):
+        self.assertEqual(self.compiled_data.categories, self.json_data.categories)
+        self.assertEqual(self.compiled_data.members, self.json_data.members)
+
+    def test_same_tone_index(self):
+        # Read straight from the table, one character at a time
+        for codepoint, code in self.json_data.tone_index.items():
+            self.assertEqual(self.compiled_data.tone_index[codepoint], code)
+            self.assertEqual(self.compiled_data.tone_masks[codepoint], self.json_data.tone_masks[codepoint])
+        self.assertEqual(self.compiled_data.tone_index[ord("？")], 0)
+        self.assertEqual(sorted(self.compiled_data.tone_mask_items()), sorted(self.json_data.tone_mask_items()))
+        self.assertEqual(self.compiled_data.polyphones, self.json_data.polyphones)
+
+    def test_same_rhyme_dict(self):
+        for char, rhyme_groups in self.json_data.rhyme_dict.items():
+            self.assertEqual(self.compiled_data.rhyme_dict[char], rhyme_groups)
+            self.assertEqual(self.compiled_data.rhyme_masks[char], self.json_data.rhyme_masks[char])
+        self.assertIsNone(self.compiled_data.rhyme_dict.get("？"))
+        self.assertNotIn("？", self.compiled_data.rhyme_dict)
+        self.assertEqual(self.compiled_data.rhyme_masks["？"], 0)
+        self.assertIsNone(self.compiled_data.rhyme_masks.get("東東"))
+
+    def test_lookups_read_only_what_is_used(self):
+        data = load_compiled(self.path)
+        self.assertEqual(PingZeClassifier().classify_codes("東東？", book=data), bytes([1, 1, 0]))
+        self.assertEqual(list(data.tone_index), [ord("東")])
+
+    def test_packaged_table_up_to_date(self):
+        # The packaged table must be compiled from the packaged JSON as it is now
+        with open(self.path, 'rb') as f, open(DEFAULT_COMPILED_PATH, 'rb') as packaged:
+            self.assertEqual(packaged.read(), f.read())
+
+    def test_stale_table_not_used(self):
+        json_path = os.path.join(self.tmpdir.name, 'stale.json')
+        with open(DEFAULT_JSON_PATH, 'rb') as f, open(json_path, 'wb') as out:
+            out.write(f.read())
+        compiled_path = compile_rhyme_data(json_path)
+        self.assertEqual(load_rhyme_data(compiled_path).categories, self.json_data.categories)
+
+        clear_rhyme_data()
+        with open(json_path, 'a', encoding='utf-8') as out:
+            out.write('\n')
+        with self.assertRaises(ValueError):
+            load_rhyme_data(compiled_path)
+
+    def test_crlf_checkout_still_matches(self):
+        # A checkout that converts line endings to CRLF must not make the table look out of date
+        json_path = os.path.join(self.tmpdir.name, 'crlf.json')
+        with open(DEFAULT_JSON_PATH, 'rb') as f:
+            source = f.read()
+        with open(json_path, 'wb') as out:
+            out.write(source)
+        compiled_path = compile_rhyme_data(json_path)
+        with open(json_path, 'wb') as out:
+            out.write(source.replace(b'\n', b'\r\n'))
+        self.assertEqual(load_rhyme_data(compiled_path).categories, self.json_data.categories)
+
+    def test_classify_from_compiled(self):
+        classifier = PingZeClassifier(self.path)
+        self.assertEqual(classifier.classify("知否"), ['ping', 'ze'])
+
+if __name__ == '__main__':
+    unittest.main()
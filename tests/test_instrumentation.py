@@ -0,0 +1,77 @@
+import unittest
+from pingshui_rhyme import PingZeClassifier, PoemStructureChecker, PoemSession
+from pingshui_rhyme import instrumentation
+
+POEM = '床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。'
+
+class TestInstrumentation(unittest.TestCase):
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_by_default(self):
+        self.assertFalse(instrumentation.is_enabled())
+        # Disabled methods are the originals, without a wrapper
+        self.assertFalse(hasattr(PingZeClassifier.classify_codes, '__wrapped__'))
+
+    def test_profile(self):
+        checker = PoemStructureChecker(cache_size=4)
+        with instrumentation.profile() as stats:
+            checker.check_poem(POEM)
+            checker.check_poem(POEM)
+            PingZeClassifier().classify('東x')
+        self.assertFalse(instrumentation.is_enabled())
+
+        stages = stats['stages']
+        self.assertEqual(stages['check_poem_rhyming']['calls'], 2)
+        self.assertEqual(stages['rhyming.rules']['calls'], 1)  # The second check is cached
+        self.assertEqual(stages['meter.patterns']['calls'], 1)
+        self.assertGreater(stages['check_poem_pingze_meter']['time'], 0)
+        self.assertEqual(stats['lookups']['misses'], 1)
+        self.assertEqual(stats['caches']['hits'], 2)
+        self.assertEqual(stats['caches']['misses'], 2)
+
+    def test_hooks_and_snapshots(self):
+        calls = []
+        hook = lambda stage, seconds: calls.append(stage)
+        instrumentation.add_hook(hook)
+        try:
+            instrumentation.enable()
+            before = instrumentation.snapshot()
+            PoemStructureChecker().check_poem_pingze_meter(POEM)
+            batch = instrumentation.diff(instrumentation.snapshot(), before)
+        finally:
+            instrumentation.remove_hook(hook)
+        self.assertIn('classify', calls)
+        self.assertEqual(batch['stages']['check_poem_pingze_meter']['calls'], 1)
+        self.assertEqual(batch['lookups'], {'hits': 20, 'misses': 0})
+
+        instrumentation.reset()
+        self.assertEqual(instrumentation.snapshot()['stages'], {})
+
+    def test_failing_hook(self):
+        def hook(stage, seconds):
+            raise RuntimeError("metrics system down")
+
+        checker = PoemStructureChecker()
+        instrumentation.add_hook(hook)
+        try:
+            with self.assertWarns(RuntimeWarning), instrumentation.profile():
+                result = checker.check_poem(POEM)
+        finally:
+            instrumentation.remove_hook(hook)
+        self.assertEqual(result, checker.check_poem(POEM))
+
+    def test_lookups_count_poem_characters(self):
+        # Suggestions and session line endings are looked up without counting as classified characters
+        poem = '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。'
+        with instrumentation.profile() as stats:
+            PoemStructureChecker().closest_meter_patterns(poem)
+        self.assertEqual(stats['lookups'], {'hits': 20, 'misses': 0})
+
+        with instrumentation.profile() as stats:
+            PoemSession(PoemStructureChecker(), poem)
+        self.assertEqual(stats['lookups'], {'hits': 20, 'misses': 0})
+
+if __name__ == '__main__':
+    unittest.main()
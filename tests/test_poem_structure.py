@@ -42,5 +42,112 @@ class TestPoemStructure(unittest.TestCase):
         self.assertTrue(result)
         self.assertEqual(message, "Poem follows the less restrictive ping-ze alternation pattern in 2nd, 4th, and 6th characters.")
 
+    def test_pingze_meter_patterns(self):
+        # Build 8-line poems that follow each scheme exactly, using 東 (ping) and 董 (ze)
+        for characters_per_line in [5, 7]:
+            for scheme, expected_patterns in self.checker.patterns[characters_per_line].items():
+                poem = '，'.join(line.replace('平', '東').replace('仄', '董') for line in expected_patterns)
+                result, message = self.checker.check_poem_pingze_meter(poem)
+                self.assertTrue(result)
+                self.assertEqual(message, f"Poem follows {scheme} ping-ze pattern.")
+
+    def test_pingze_meter_mismatch(self):
+        poem = '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。'
+        result, message = self.checker.check_poem_pingze_meter(poem)
+        self.assertFalse(result)
+        self.assertEqual(message, "Ping ze tone mismatch between line 1 and line 2 at character position 4.")
+
+    def test_empty_poem(self):
+        for poem in ('', '。。', ' \n'):
+            self.assertEqual(self.checker.check_poem_pingze_meter(poem), (False, "Poem has no lines."))
+            self.assertFalse(self.checker.check_poem(poem)[0][0])
+
+    def test_pingze_meter_short_line(self):
+        # Splitting at punctuation can leave a line shorter than its pair, which the alternation check can't compare
+        for poem in ('床前明月光，疑是。', '床前明月光，疑是地上霜。舉頭，低頭思故鄉。'):
+            self.assertEqual(self.checker.check_poem_pingze_meter(poem), (False, "Each line must have 5 characters like the first line."))
+            self.assertFalse(self.checker.check_poem(poem)[1][0])
+
+    def test_pingze_meter_polyphonic(self):
+        # 幾 is listed under both ping and ze, so only the polyphonic check lets it alternate with 南
+        poem = '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。'
+        result, message = PoemStructureChecker(polyphonic=True).check_poem_pingze_meter(poem)
+        self.assertTrue(result)
+
+    def test_closest_meter_patterns(self):
+        for characters_per_line in [5, 7]:
+            for scheme, expected_patterns in self.checker.patterns[characters_per_line].items():
+                poem = '，'.join(line.replace('平', '東').replace('仄', '董') for line in expected_patterns)
+                nearest = self.checker.closest_meter_patterns(poem)
+                self.assertEqual((nearest[0].scheme, nearest[0].distance), (scheme, 0))
+                self.assertEqual(len(nearest), 4)
+                self.assertEqual([n.distance for n in nearest], sorted(n.distance for n in nearest))
+
+    def test_closest_meter_patterns_violations(self):
+        poem = '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。'
+        nearest = self.checker.closest_meter_patterns(poem, k=1)
+        self.assertEqual(len(nearest), 1)
+        self.assertEqual(nearest[0].scheme, 'oblique_tone_unrhymed')
+        violations = nearest[0].violations
+        self.assertEqual([(v.line, v.position, v.character, v.expected) for v in violations],
+                         [(0, 0, '紅', 'ze'), (1, 3, '幾', 'ze'), (2, 0, '願', 'ping')])
+        for violation in violations:
+            self.assertEqual(len(violation.suggestions), 5)
+            self.assertEqual(set(self.checker.classifier.classify(violation.suggestions)), {violation.expected})
+        # The suggestions follow each character's rhyme into the other tone, e.g. 願 (去聲十四願) to 上平聲十三元
+        self.assertEqual(violations[2].suggestions, self.checker.rhyme_checker.characters_in_group('上平聲十三元')[:5])
+        self.assertNotEqual(violations[0].suggestions, violations[1].suggestions)
+
+    def test_closest_meter_patterns_first_line_rhyme(self):
+        # In a 首句入韻 scheme the first line rhymes too, so its suggestions keep the rhyme of the even-numbered lines
+        lines = [line.replace('平', '東').replace('仄', '董') for line in self.checker.patterns[5]['even_tone_rhymed'][:4]]
+        lines[0] = lines[0][:-1] + '董'
+        lines[1] = lines[1][:-1] + '江'
+        lines[3] = lines[3][:-1] + '江'
+        nearest = self.checker.closest_meter_patterns('，'.join(lines), suggestions=3)
+        violation, = next(n for n in nearest if n.scheme == 'even_tone_rhymed').violations
+        self.assertEqual((violation.line, violation.position, violation.expected), (0, 4, 'ping'))
+        self.assertEqual(violation.suggestions, self.checker.rhyme_checker.characters_in_group('上平聲三江')[:3])
+
+    def test_closest_meter_patterns_negative_k(self):
+        with self.assertRaises(ValueError):
+            self.checker.closest_meter_patterns('床前明月光，疑是地上霜。', k=-1)
+
+    def test_closest_meter_patterns_rhyme_suggestions(self):
+        # The 4th line ends in ze where the scheme expects it to rhyme with the 2nd line's 江
+        lines = [line.replace('平', '東').replace('仄', '董') for line in self.checker.patterns[5]['oblique_tone_unrhymed'][:4]]
+        lines[1] = lines[1][:-1] + '江'
+        lines[3] = lines[3][:-1] + '董'
+        violation, = self.checker.closest_meter_patterns('，'.join(lines), k=1, suggestions=3)[0].violations
+        self.assertEqual((violation.line, violation.position, violation.expected), (3, 4, 'ping'))
+        self.assertEqual(violation.suggestions, self.checker.rhyme_checker.characters_in_group('上平聲三江')[:3])
+
+    def test_closest_meter_patterns_no_shared_rhyme(self):
+        # The 2nd line ends in 江 and the 6th and 8th in 東, so the other even-numbered lines share no category
+        lines = [line.replace('平', '東').replace('仄', '董') for line in self.checker.patterns[5]['oblique_tone_unrhymed']]
+        lines[1] = lines[1][:-1] + '江'
+        lines[3] = lines[3][:-1] + '腫'
+        violation, = self.checker.closest_meter_patterns('，'.join(lines), k=1, suggestions=3)[0].violations
+        self.assertEqual((violation.line, violation.position, violation.expected), (3, 4, 'ping'))
+        # Suggestions follow 腫 (上聲二腫) into its ping counterpart rather than the rhyme of the last lines
+        self.assertEqual(violation.suggestions, self.checker.rhyme_checker.characters_in_group('上平聲二冬')[:3])
+
+    def test_closest_meter_patterns_irregular(self):
+        self.assertEqual(self.checker.closest_meter_patterns('床前明月光，疑是地上霜霜。'), [])
+
+    def test_rhyme_scheme(self):
+        # 排律 of 12 lines, beyond the 4 or 8 lines of check_poem_rhyming
+        poem = '，'.join(['東' * 5, '同' * 5, '董' * 5, '銅' * 5] * 3)
+        self.assertEqual(self.checker.rhyme_scheme(poem).scheme, 'AAxA' * 3)
+
+    def test_check_corpus(self):
+        poems = [
+            '床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。',
+            '紅豆生南國，春來發幾枝。願君多采擷，此物最相思。',
+        ] * 5
+        expected = [self.checker.check_poem(poem) for poem in poems]
+        self.assertEqual(list(self.checker.check_corpus(poems)), expected)
+        self.assertEqual(list(self.checker.check_corpus(iter(poems), processes=2, chunksize=3)), expected)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -18,6 +18,52 @@ class TestRhymeChecker(unittest.TestCase):
         result = self.rhymechecker.do_rhyme(char1, char3)
         self.assertFalse(result)
 
+    def test_do_rhyme_polyphonic(self):
+        self.assertTrue(self.rhymechecker.do_rhyme("鄉", "昌"))
+        self.assertFalse(self.rhymechecker.do_rhyme("鄉", "東"))
+
+    def test_do_rhyme_unknown(self):
+        self.assertFalse(self.rhymechecker.do_rhyme("東", "a"))
+
+    def test_rhyme_matrix(self):
+        result = self.rhymechecker.rhyme_matrix("鄉昌東")
+        expected = [[True, True, False], [True, True, False], [False, False, True]]
+        self.assertEqual(result, expected)
+
+    def test_characters_in_group(self):
+        characters = self.rhymechecker.characters_in_group("上平聲一東")
+        self.assertTrue(characters.startswith("東同銅"))
+        self.assertIs(characters, self.rhymechecker.characters_in_group(('ping', '上平聲部', '上平聲一東')))
+        self.assertIn("東", self.rhymechecker.characters_in_group("上平聲部"))
+        self.assertIsNone(self.rhymechecker.characters_in_group("上平聲一百"))
+
+    def test_rhyming_candidates(self):
+        candidates = list(self.rhymechecker.rhyming_candidates("東", limit=3))
+        self.assertEqual(candidates, ["同", "銅", "桐"])
+        for candidate in self.rhymechecker.rhyming_candidates("鄉", tone='ze', limit=10):
+            shared = set(self.rhymechecker.get_rhyme_group("鄉")) & set(self.rhymechecker.get_rhyme_group(candidate))
+            self.assertIn('ze', [tone_type for tone_type, _, _ in shared])
+
+    def test_rhyme_scheme(self):
+        scheme = self.rhymechecker.rhyme_scheme('光霜月鄉')
+        self.assertEqual(str(scheme), 'AAxA')
+        self.assertEqual(scheme.runs[0].lines, (0, 1, 3))
+        self.assertEqual(scheme.runs[0].categories, (('ping', '下平聲部', '下平聲七陽'),))
+
+    def test_rhyme_scheme_changes(self):
+        # Rhyme changes from 東 to 董 to 江 and back to 東, and a line ending in a character not in the data
+        scheme = self.rhymechecker.rhyme_scheme('東同董動x江窗東中')
+        self.assertEqual(scheme.scheme, 'AABB?CCAA')
+        self.assertEqual(scheme.changes, [2, 5, 7])
+        self.assertEqual([run.letter for run in scheme.runs], ['A', 'B', 'C', 'A'])
+
+    def test_rhyme_scheme_long_poem(self):
+        endings = '人東人同人銅人桐' * 2000 + '人董人動'
+        scheme = self.rhymechecker.rhyme_scheme(endings)
+        self.assertEqual(len(scheme.scheme), len(endings))
+        self.assertEqual(len(scheme.runs), 2)
+        self.assertEqual(scheme.changes, [len(endings) - 3])
+
     def test_get_rhyme_type(self):
         char = "東"
         result = self.rhymechecker.get_rhyme_type(char)
@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+import unittest
+from pingshui_rhyme import PingZeClassifier, RhymeChecker, PoemStructureChecker
+from pingshui_rhyme.compiled import compile_rhyme_data
+from pingshui_rhyme.poem_structure_checker import _init_worker
+from pingshui_rhyme.rhyme_data import load_rhyme_data, clear_rhyme_data, register_rhyme_book, rhyme_books, _books, _shared_keys
+
+# A small book in the flat layout where, as in 詞林正韻, 東 and 冬 share a rhyme category
+TEST_BOOK = {"categories": [
+    {"tone": "ping", "group": "第一部", "category": "第一部平聲", "characters": "東冬風紅鍾"},
+    {"tone": "ze", "group": "第一部", "category": "第一部仄聲", "characters": "董送腫"},
+]}
+
+class TestRhymeData(unittest.TestCase):
+
+    def test_loaded_once(self):
+        self.assertIs(load_rhyme_data(), load_rhyme_data())
+
+    def test_shared_between_checkers(self):
+        checker = PoemStructureChecker()
+        self.assertIs(checker.classifier.data, checker.rhyme_checker.data)
+        self.assertIs(PingZeClassifier().tone_index, RhymeChecker().data.view('tone_index'))
+
+    def test_rhyme_groups_interned(self):
+        data = load_rhyme_data()
+        self.assertIs(data.rhyme_dict["東"][0], data.rhyme_dict["同"][0])
+        self.assertIn(data.rhyme_dict["東"][0], data.categories)
+
+    def test_counterparts(self):
+        data = load_rhyme_data()
+        names = [[data.categories[other][2] for other in counterparts] for counterparts in data.counterparts]
+        self.assertEqual(names[data.category_ids[data.rhyme_dict["東"][0]]][:2], ['上聲一董', '去聲一送'])
+        self.assertEqual(names[data.category_ids[data.rhyme_dict["董"][0]]][0], '上平聲一東')
+
+class TestRhymeBooks(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test_book.json')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(TEST_BOOK, f, ensure_ascii=False)
+        register_rhyme_book('test', self.path)
+
+    def tearDown(self):
+        del _books['test']
+        self.directory.cleanup()
+
+    def test_load_by_name(self):
+        self.assertIn('test', rhyme_books())
+        self.assertIn('pingshui', rhyme_books())
+        self.assertIs(load_rhyme_data('test'), load_rhyme_data(self.path))
+        self.assertIs(load_rhyme_data('pingshui'), load_rhyme_data())
+        self.assertEqual(RhymeChecker('test').get_rhyme_group("冬"), (("ping", "第一部", "第一部平聲"),))
+
+    def test_switch_book_per_call(self):
+        classifier = PingZeClassifier()
+        rhyme_checker = RhymeChecker()
+        self.assertFalse(rhyme_checker.do_rhyme("東", "冬"))
+        self.assertTrue(rhyme_checker.do_rhyme("東", "冬", book='test'))
+        self.assertTrue(rhyme_checker.do_rhyme("東", "冬", book=load_rhyme_data(self.path)))
+        self.assertEqual(classifier.classify("東董月", book='test'), ['ping', 'ze', 'unknown'])
+        self.assertEqual(classifier.classify("東董月"), ['ping', 'ze', 'ze'])
+        self.assertEqual(rhyme_checker.characters_in_group('第一部', book='test'), "東冬風紅鍾董送腫")
+        self.assertEqual(list(rhyme_checker.rhyming_candidates("東", book='test')), list("冬風紅鍾"))
+
+    def test_checker_results_cached_per_book(self):
+        checker = PoemStructureChecker(cache_size=16)
+        poem = "東風吹落紅，冬日映孤鍾，送客思董腫，花開又見紅。"
+        default = checker.check_poem_rhyming(poem)
+        self.assertNotEqual(checker.check_poem_rhyming(poem, book='test'), default)
+        self.assertEqual(checker.check_poem_rhyming(poem), default)
+        self.assertEqual(checker.check_poem_rhyming(poem, book='test'), PoemStructureChecker('test').check_poem_rhyming(poem))
+
+    def test_compiled_book(self):
+        compiled_path = os.path.join(self.directory.name, 'test_book.bin')
+        compile_rhyme_data(self.path, compiled_path)
+        data = load_rhyme_data(compiled_path)
+        self.assertEqual(data.categories, load_rhyme_data(self.path).categories)
+        self.assertEqual(PingZeClassifier().classify("東董月", book=data), ['ping', 'ze', 'unknown'])
+
+    def test_books_share_keys(self):
+        # The compiled book keeps the characters it has looked up, the JSON book all of its characters
+        pingshui = load_rhyme_data().rhyme_masks
+        book = load_rhyme_data('test').rhyme_masks
+        pingshui[''.join(["東"])]
+        self.assertIs(next(char for char in pingshui if char == "東"), next(char for char in book if char == "東"))
+
+        tone_masks = load_rhyme_data('test').tone_masks
+        self.assertIs(next(codepoint for codepoint in tone_masks if codepoint == ord("董")), _shared_keys[ord("董")])
+
+        clear_rhyme_data()
+        self.assertEqual(_shared_keys, {})
+
+    def test_workers_get_registered_books(self):
+        # Workers that don't inherit this process's registry, as with spawn, get it from the pool initializer
+        args = PoemStructureChecker()._worker_args()
+        del _books['test']
+        _init_worker(*args)
+        self.assertIn('test', rhyme_books())
+
+if __name__ == '__main__':
+    unittest.main()
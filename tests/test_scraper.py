@@ -0,0 +1,103 @@
+import contextlib
+import functools
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from pingshui_rhyme.compiled import load_compiled
+from pingshui_rhyme.scraper import parse_page, emit_rhyme_data, fetch_page, main
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+PAGE = os.path.join(FIXTURES, 'wikisource_pingshui.html')
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+class TestScraper(unittest.TestCase):
+
+    def test_parse_page(self):
+        rhyme_dict = parse_page(PAGE, 'html.parser', chunk_size=7)
+        self.assertEqual(list(rhyme_dict), ['ping', 'ze'])
+        self.assertEqual(list(rhyme_dict['ping']['上平聲部']), ['上平聲一東', '上平聲二冬'])
+        self.assertEqual(
+            rhyme_dict['ping']['上平聲部']['上平聲一東'],
+            ['東同銅桐筒童僮瞳中衷忠沖終戎崇嵩弓躬宮融雄熊穹窮馮風楓豐'],
+        )
+        # Links, entities and 【辭】 notes in nested divs are read like the rest of the text
+        self.assertEqual(rhyme_dict['ping']['上平聲部']['上平聲二冬'], ['冬農宗鍾龍舂松衝容蓉&庸封胸凶匈洶'])
+        self.assertEqual(list(rhyme_dict['ze']['入聲部']), ['入聲一屋', '入聲二沃'])
+
+    @unittest.skipIf(lxml is None, "lxml is not installed")
+    def test_parse_page_lxml(self):
+        self.assertEqual(parse_page(PAGE, 'lxml'), parse_page(PAGE, 'html.parser'))
+
+    def test_emit_only_when_changed(self):
+        rhyme_dict = parse_page(PAGE, 'html.parser')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_file = os.path.join(tmpdir, 'rhymes.json')
+            self.assertTrue(emit_rhyme_data(rhyme_dict, output_file))
+            self.assertFalse(emit_rhyme_data(rhyme_dict, output_file))
+            self.assertEqual(sorted(os.listdir(tmpdir)), ['rhymes.bin', 'rhymes.json'])
+
+            with open(output_file, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), rhyme_dict)
+            data = load_compiled(os.path.join(tmpdir, 'rhymes.bin'))
+            self.assertEqual(data.rhyme_dict['董'], (('ze', '上聲部', '上聲一董'),))
+
+            rhyme_dict['ze']['去聲部']['去聲一送'] = ['送夢']
+            self.assertTrue(emit_rhyme_data(rhyme_dict, output_file))
+
+    def test_main_regenerates_existing_data(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_file = os.path.join(tmpdir, 'rhymes.json')
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump({'ping': {}, 'ze': {}}, f)
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(main(['--html', PAGE, '--output', output_file]), 0)
+            with open(output_file, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), parse_page(PAGE))
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'rhymes.bin')))
+
+    @unittest.skipIf(requests is None, "requests is not installed")
+    def test_fetch_page_cache(self):
+        requests_seen = []
+
+        class Handler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                requests_seen.append(self.headers.get('If-Modified-Since'))
+                super().do_GET()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=FIXTURES))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = f'http://127.0.0.1:{server.server_port}/wikisource_pingshui.html'
+            with tempfile.TemporaryDirectory() as cache_dir:
+                html_file = fetch_page(url, cache_dir)
+                with open(html_file, 'rb') as cached, open(PAGE, 'rb') as page:
+                    self.assertEqual(cached.read(), page.read())
+                # The second request is conditional and answered from the cache
+                self.assertEqual(fetch_page(url, cache_dir), html_file)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.assertIsNone(requests_seen[0])
+        self.assertIsNotNone(requests_seen[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import io
+import unittest
+from pingshui_rhyme import PoemStructureChecker
+from pingshui_rhyme.segmenter import PoemSegmenter, segment_poems
+
+JUEJU = ['床前明月光', '疑是地上霜', '舉頭望明月', '低頭思故鄉']
+LUSHI = ['昔人已乘黃鶴去', '此地空餘黃鶴樓', '黃鶴一去不復返', '白雲千載空悠悠',
+         '晴川歷歷漢陽樹', '芳草萋萋鸚鵡洲', '日暮鄉關何處是', '煙波江上使人愁']
+
+DOCUMENT = '''《靜夜思》 李白
+床前明月光，疑是地上霜。
+舉頭望明月，低頭思故鄉。
+
+Notes: a famous poem.
+黃鶴樓
+昔人已乘黃鶴去此地空餘黃鶴樓黃鶴一去不復返白雲千載空悠悠
+晴川歷歷漢陽樹，芳草萋萋鸚鵡洲；日暮鄉關何處是，煙波江上使人愁。
+'''
+
+class TestSegmenter(unittest.TestCase):
+
+    def test_segment_document(self):
+        self.assertEqual(list(segment_poems(DOCUMENT)), [JUEJU, LUSHI])
+
+    def test_chunked_input(self):
+        # The result doesn't depend on where the chunks end
+        for chunk_size in [1, 2, 3, 7, 100]:
+            self.assertEqual(list(segment_poems(io.StringIO(DOCUMENT), chunk_size)), [JUEJU, LUSHI])
+
+    def test_consecutive_poems(self):
+        segmenter = PoemSegmenter()
+        poems = list(segmenter.feed('，'.join(JUEJU * 2 + LUSHI[:4])))
+        poems += list(segmenter.close())
+        # 8 lines of 5 characters are read as one lushi, then the 7-character jueju
+        self.assertEqual(poems, [JUEJU * 2, LUSHI[:4]])
+
+    def test_skips_non_verse(self):
+        text = 'x' * 10000 + '\n' + '，'.join(JUEJU) + '\n' + '長' * 10000
+        self.assertEqual(list(segment_poems(io.StringIO(text), 64)), [JUEJU])
+        self.assertEqual(list(segment_poems('一二三，四五六，七八九，十百千')), [])
+
+    def test_titles_and_attributions(self):
+        # Lines without punctuation next to punctuated verse are not part of the poem, whichever end they are at
+        poem = '床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。\n'
+        for text in [poem + '唐代李白作\n\n', '黃鶴樓送孟浩然之廣陵\n' + poem, '唐代李白作\n' + poem + '唐代李白作\n']:
+            for chunk_size in [1, 3, 100]:
+                self.assertEqual(list(segment_poems(io.StringIO(text), chunk_size)), [JUEJU])
+        # Without any punctuation, an extra first line is still taken for a title
+        self.assertEqual(list(segment_poems('唐代李白作\n' + '\n'.join(JUEJU))), [JUEJU])
+        # A punctuated extra line can't be told from verse, so the poem is skipped rather than yielded wrong
+        self.assertEqual(list(segment_poems('唐代李白作。' + poem)), [])
+
+    def test_clean_poem(self):
+        checker = PoemStructureChecker()
+        self.assertEqual(checker.clean_poem('  床前明月光，\n  疑是地上霜。\n 舉頭望明月 低頭思故鄉'), JUEJU)
+        self.assertEqual(checker.clean_poem(''.join(LUSHI)), LUSHI)
+        self.assertEqual(checker.clean_poem('床前明月光疑是地上霜，舉頭望明月，低頭思故鄉'), JUEJU)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from pingshui_rhyme import PoemStructureChecker, PoemSession
+
+LINES = ['白日依山盡', '黃河入海流', '欲窮千里目', '更上一層樓']
+
+class TestPoemSession(unittest.TestCase):
+    def setUp(self):
+        self.checker = PoemStructureChecker()
+        self.session = PoemSession(self.checker, '，'.join(LINES))
+
+    def assertMatchesFullCheck(self):
+        self.assertEqual(self.session.check_poem(), self.checker.check_poem('，'.join(self.session.lines)))
+
+    def test_initial_check(self):
+        self.assertEqual(self.session.lines, LINES)
+        self.assertMatchesFullCheck()
+
+    def test_set_line(self):
+        # 目 -> 明 breaks the ze ending of line 3 and the alternation with line 4
+        self.session.set_line(2, '欲窮千里明。')
+        self.assertEqual(self.session.lines[2], '欲窮千里明')
+        self.assertMatchesFullCheck()
+        self.session.set_line(-2, '欲窮千里目')
+        self.assertMatchesFullCheck()
+
+    def test_insert_and_delete_lines(self):
+        for line in LINES:
+            self.session.insert_line(len(self.session.lines), line)
+        self.assertEqual(len(self.session.lines), 8)
+        self.assertMatchesFullCheck()
+        self.session.delete_line(0)
+        self.session.insert_line(0, '床前明月光')
+        self.assertMatchesFullCheck()
+
+    def test_line_length_change(self):
+        self.session.check_poem()
+        self.session.set_line(0, '白日依山')
+        self.assertEqual(self.session.check_poem(), ((False, "Each line must have 5 or 7 characters."),) * 2)
+        self.session.set_line(0, '白日依山盡')
+        self.assertMatchesFullCheck()
+
+    def test_invalid_edits(self):
+        with self.assertRaises(ValueError):
+            self.session.set_line(0, '，')
+        with self.assertRaises(IndexError):
+            self.session.set_line(4, '白日依山盡')
+        # clean_poem would split these into two lines, so they can't be set as one
+        for text in ('白日依山盡黃河入海流', '白日，依山盡'):
+            with self.assertRaises(ValueError):
+                self.session.set_line(0, text)
+            with self.assertRaises(ValueError):
+                self.session.insert_line(0, text)
+        self.assertEqual(self.session.lines, LINES)
+
+    def test_half_typed_line(self):
+        # A line being typed is shorter than its pair until it is finished
+        for text in ('黃', '黃河', '黃河入海'):
+            self.session.set_line(1, text)
+            self.assertEqual(self.session.check_poem_pingze_meter(), (False, "Each line must have 5 characters like the first line."))
+            self.assertMatchesFullCheck()
+        self.session.set_line(1, '黃河入海流')
+        self.assertMatchesFullCheck()
+
+    def test_empty_session(self):
+        session = PoemSession(self.checker)
+        self.assertEqual(session.check_poem(), self.checker.check_poem(''))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pingshui_rhyme import PingZeClassifier, RhymeChecker, PoemStructureChecker
+from pingshui_rhyme.rhyme_data import RhymeData, DEFAULT_JSON_PATH
+
+POEMS = [
+    "床前明月光，疑是地上霜。舉頭望明月，低頭思故鄉。",
+    "白日依山盡，黃河入海流。欲窮千里目，更上一層樓。",
+    "國破山河在，城春草木深。感時花濺淚，恨別鳥驚心。烽火連三月，家書抵萬金。白頭搔更短，渾欲不勝簪。",
+    "朝辭白帝彩雲間，千里江陵一日還。兩岸猿聲啼不住，輕舟已過萬重山。",
+]
+
+def _free_threaded():
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+class TestThreadSafety(unittest.TestCase):
+
+    def setUp(self):
+        self.checker = PoemStructureChecker()
+        self.expected = [self.checker.check_poem(poem) for poem in POEMS]
+
+    def _read_all(self, rounds):
+        # Exercise every read API and return the poem results
+        results = []
+        for _ in range(rounds):
+            for poem in POEMS:
+                results.append(self.checker.check_poem(poem))
+                self.checker.classifier.classify(poem, polyphonic=True)
+                self.checker.rhyme_scheme(poem)
+                self.checker.rhyme_checker.do_rhyme(poem[4], poem[10])
+        return results
+
+    def test_concurrent_reads_match_serial(self):
+        rounds = 50
+        with ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(self._read_all, rounds) for _ in range(8)]
+            for future in futures:
+                self.assertEqual(future.result(), self.expected * rounds)
+
+    def test_first_use_races(self):
+        # Threads that all build the indexes of a fresh book at once get the same index objects
+        data = RhymeData.from_json(DEFAULT_JSON_PATH)
+        barrier = threading.Barrier(8)
+
+        def build():
+            barrier.wait()
+            return data.rhyme_masks, data.tone_index, data.view('rhyme_dict')
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: build(), range(8)))
+        for result in results:
+            for index, first in zip(result, results[0]):
+                self.assertIs(index, first)
+
+    def test_shared_data_is_read_only(self):
+        classifier = PingZeClassifier()
+        rhyme_checker = RhymeChecker()
+        with self.assertRaises(TypeError):
+            rhyme_checker.rhyme_dict["東"] = ()
+        with self.assertRaises(TypeError):
+            rhyme_checker.rhyme_masks["東"] = 0
+        with self.assertRaises(TypeError):
+            classifier.tone_index[ord("東")] = 0
+        with self.assertRaises(TypeError):
+            classifier.ping_ze_dict['ping']['上平聲部']['上平聲一東'] = ""
+        self.assertIsInstance(rhyme_checker.get_rhyme_group("鄉"), tuple)
+        self.assertIsInstance(rhyme_checker.rhyme_scheme("光霜月鄉").runs[0].lines, tuple)
+        with self.assertRaises(AttributeError):
+            rhyme_checker.rhyme_scheme("光霜月鄉").extra = None
+
+    def test_passing_results_shared(self):
+        self.assertIs(self.checker.check_poem(POEMS[0])[0], self.checker.check_poem(POEMS[1])[0])
+
+    @unittest.skipUnless(_free_threaded() and (os.cpu_count() or 1) >= 4, "needs a free-threaded build and 4 CPUs")
+    def test_read_scaling(self):
+        def throughput(threads):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as executor:
+                list(executor.map(self._read_all, [20] * threads))
+            return threads / (time.perf_counter() - start)
+
+        throughput(1)  # Warm up
+        # Reads take no locks, so 4 threads should do well over twice the work of one in the same time
+        self.assertGreater(throughput(4), 2 * throughput(1))
+
+if __name__ == '__main__':
+    unittest.main()